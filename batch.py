@@ -0,0 +1,153 @@
+# Applies a function to all the files of a project, each file in one of a pool of processes. Files are read as
+# when they are opened, with the functions of their configuration; the results go to the function store (see
+# functions.cache), so that opening the files afterwards does not compute them again, and the function is added
+# to the project configuration of each header it was computed for.
+# Usage: python batch.py <project.json> <function> <name> <source[,source...]> [parameter=value ...] [--workers n]
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import config
+from functions import pipeline
+
+
+def init_worker():
+    # Results of the workers are only useful if stored, whatever the settings
+    config.set_tsl_config(function_store=True)
+
+
+def apply_file(file_path, project, functions, spec):
+    start = time.perf_counter()
+    datafile = config.open_project_file(file_path, project["labels"])
+    datafile = config.read_labels(config.resample_project_file(datafile, project))
+    header = datafile.get_original_header()
+    columns = datafile.get_data_columns()
+
+    specs = functions.get(str(header), [])
+    if spec["name"] in [config.get_function_name(f) for f in specs] + list(datafile.df):
+        raise ValueError("Column {} already exists".format(spec["name"]))
+    if spec["name"] in pipeline.apply_functions(datafile, specs + [spec], sample=False):
+        raise ValueError("Cannot compute {} (are there columns {}?)".format(
+            spec["name"], ", ".join(config.get_function_sources(spec))))
+    return header, columns, time.perf_counter() - start
+
+
+def run(folder, project, spec, workers=None, progress=None):
+    # file -> (header, data columns, seconds) or the exception raised. progress(done, total, file, result) is
+    # called as files are completed: it may return False to cancel those not started yet
+    files = project["files"]
+    functions = {key: conf["functions"] for key, conf in project.items()
+                 if isinstance(conf, dict) and "functions" in conf}
+    # settings used to read the files
+    options = {key: project[key] for key in ("labels", "resample", "sample_rate") if key in project}
+    results = {}
+
+    # not forked: the parent process may be running threads (and the GUI)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker) as executor:
+        futures = {executor.submit(apply_file, os.path.join(folder, file), options, functions, spec): file
+                   for file in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            file = futures[future]
+            try:
+                results[file] = future.result()
+            except Exception as e:
+                config.logger.warning("Function {} failed on {}: {!r}".format(spec["name"], file, e))
+                results[file] = e
+
+            if progress is not None and progress(done, len(files), file, results[file]) is False:
+                for pending in futures:
+                    pending.cancel()
+                break
+    return results
+
+
+def get_headers(results):
+    # header -> data columns of the files the function was computed for
+    return {str(r[0]): r[1] for r in results.values() if not isinstance(r, Exception)}
+
+
+def get_failures(results):
+    return {file: r for file, r in results.items() if isinstance(r, Exception)}
+
+
+def parse_parameters(function, args):
+    # name=value arguments, converted as the function dialog would; defaults for the missing ones
+    param = {}
+    for key, desc in function.get_parameters().items():
+        if desc["type"] == "combo":
+            param[key] = desc["values"][desc["default"]]
+        elif desc["type"] == "int":
+            param[key] = desc["default"]
+        elif "default" in desc:
+            param[key] = str(desc["default"])
+
+    for arg in args:
+        key, value = arg.split('=', 1)
+        desc = function.get_parameters().get(key)
+        if desc is None:
+            raise ValueError("Unknown parameter {}".format(key))
+        if desc["type"] == "int":
+            value = int(value)
+        elif desc["type"] == "combo" and value not in desc["values"]:
+            raise ValueError("{} must be one of {}".format(key, ", ".join(desc["values"])))
+        param[key] = value
+    return param
+
+
+def main(args):
+    workers = None
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+    if len(args) < 4:
+        print("Usage: python batch.py <project.json> <function> <name> <source[,source...]> [parameter=value ...] "
+              "[--workers n]")
+        return 1
+
+    project_file, function_name, name, source = args[:4]
+    functions = pipeline.get_function_classes()
+    if function_name not in functions:
+        print("Unknown function {}, available: {}".format(function_name, ", ".join(functions)))
+        return 1
+    try:
+        param = parse_parameters(functions[function_name](), args[4:])
+    except ValueError as e:
+        print(e)
+        return 1
+    sources = source.split(',')
+    if len(sources) != len(functions[function_name]().get_sources()):
+        print("{} takes {} sources: {}".format(function_name, len(functions[function_name]().get_sources()),
+                                               ", ".join(functions[function_name]().get_sources())))
+        return 1
+    spec = pipeline.make_spec(function_name, name, sources, param)
+
+    project = config.read_json(project_file)
+    if project is None:
+        return 2
+
+    def progress(done, total, file, result):
+        if isinstance(result, Exception):
+            print("[{}/{}] {}: failed ({})".format(done, total, file, result))
+        else:
+            print("[{}/{}] {}: {:.2f} s".format(done, total, file, result[2]))
+
+    start = time.perf_counter()
+    results = run(os.path.dirname(os.path.abspath(project_file)), project, spec, workers, progress)
+    elapsed = time.perf_counter() - start
+
+    config.insert_project_function(project, spec, get_headers(results))
+    if not config.write_json(project, project_file):
+        return 2
+
+    failures = get_failures(results)
+    total = sum(r[2] for r in results.values() if not isinstance(r, Exception))
+    print("{} of {} files in {:.1f} s ({:.1f} s of processing), {} failed".format(
+        len(results) - len(failures), len(project["files"]), elapsed, total, len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
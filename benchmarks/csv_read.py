@@ -0,0 +1,74 @@
+# Compares the former three-pass CSV read with the single-pass CSVFormat.read
+# Usage: python benchmarks/csv_read.py [folder]
+import os
+import sys
+import csv
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from formats.csv_format import CSVFormat
+
+DEFAULT_FOLDER = 'mw_ppg_dataset/bp_dataset_200Hz'
+REPEAT = 5
+
+
+def three_pass_read(filename):
+    timings = {}
+    start = time.perf_counter()
+    with open(filename) as csv_file:
+        d = csv.Sniffer().sniff(csv_file.read(1024))
+    timings["sniff"] = time.perf_counter() - start
+
+    df = pd.read_csv(filename, dialect=d, sep=d.delimiter, doublequote=d.doublequote)
+    timings["parse"] = time.perf_counter() - start - timings["sniff"]
+
+    with open(filename, 'r') as f:
+        reader = csv.reader(f, dialect=d)
+        header = next(reader)
+    df.columns = header
+    timings["header"] = time.perf_counter() - start - timings["sniff"] - timings["parse"]
+    return df, timings
+
+
+def single_pass_read(filename):
+    io = CSVFormat()
+    df = io.read(filename)
+    return df, io.timings
+
+
+def run(name, reader, files):
+    # Best of REPEAT runs, to filter out the noise of a busy machine
+    best = None
+    for _ in range(REPEAT):
+        totals = {}
+        for filename in files:
+            _, timings = reader(filename)
+            for stage, value in timings.items():
+                totals[stage] = totals.get(stage, 0.0) + value
+        if best is None or sum(totals.values()) < sum(best.values()):
+            best = totals
+
+    totals = best
+    total = sum(totals.values())
+    stages = ", ".join("{} {:.1f} ms".format(k, v * 1000) for k, v in totals.items())
+    print("{:<12} {:8.1f} ms total, {:6.2f} ms/file ({})".format(name, total * 1000, total * 1000 / len(files), stages))
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FOLDER
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.csv'))
+    if not files:
+        print("No CSV files found in {}".format(folder))
+        return
+
+    # Warm the OS page cache so that both readers start from the same conditions
+    [single_pass_read(f) for f in files]
+
+    print("{} files from {}".format(len(files), folder))
+    run("three-pass", three_pass_read, files)
+    run("single-pass", single_pass_read, files)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# Compares the former loop-based label range extraction, label column materialisation and merge of the
+# anomaly detection export with the array-based versions of DataFile, on synthetic recordings with
+# thousands of labeled segments
+# Usage: python benchmarks/label_ranges.py [rows] [segments]
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import config  # must be imported before datafile
+from datafile import DataFile
+
+DEFAULT_ROWS = 1000000
+DEFAULT_SEGMENTS = 5000
+CHANNELS = 3
+REPEAT = 3
+
+
+def loop_label_ranges(label_col):
+    ranges = []
+    start = None
+
+    for i, val in enumerate(label_col):
+        if val == 1.0 and start is None:
+            start = i
+        elif val != 1.0 and start is not None:
+            ranges.append((start, i - 1))
+            start = None
+
+    if start is not None:
+        ranges.append((start, len(label_col) - 1))
+
+    return ranges
+
+
+def loop_label_series(label, n_rows):
+    a = label[1][0]
+    b = label[1][1] + 1
+    s = pd.Series(n_rows * ['0'], name=label[0])
+    for i in range(a, b):
+        try:
+            s.iat[i] = '1'
+        except:
+            pass
+    return s
+
+
+def loop_merge(labels_list, columns, new_labels, n_rows):
+    new_columns = []
+    for label in new_labels:
+        new_column = pd.Series(n_rows * ['0'], name=label)
+        column_index = [j for j, entry in enumerate(labels_list) if entry[0] == label]
+        if len(column_index):
+            for row in range(0, len(new_column)):
+                for index in column_index:
+                    if columns[index][row] == '1':
+                        new_column[row] = '1'
+                        break
+        new_columns.append(new_column)
+    return pd.concat(new_columns, axis=1)
+
+
+def make_datafile(n_rows, labels_list=None):
+    # The label methods of DataFile only need the number of rows of the file
+    datafile = DataFile.__new__(DataFile)
+    datafile.df = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    datafile.labels_list = labels_list or []
+    return datafile
+
+
+def rle_label_series(label, n_rows):
+    return make_datafile(n_rows).get_label_series(label)
+
+
+def make_channel_labels(rows, segments, channels):
+    # Channel-independent labels, as created on the plot: one entry per segment
+    labels_list = []
+    for j in range(channels):
+        for a, b in DataFile.get_label_ranges(make_labels(rows, segments, seed=j)):
+            labels_list.append(["Anomaly_ch" + str(j), (a, b), j])
+    return labels_list
+
+
+def make_labels(rows, segments, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.choice(rows // 100, segments, replace=False)) * 100
+    lengths = rng.integers(1, 100, segments)
+    column = np.zeros(rows)
+    for a, n in zip(starts, lengths):
+        column[a:a + n] = 1
+    return pd.Series(column, name="Label")
+
+
+def best_time(function, *args):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    segments = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SEGMENTS
+    column = make_labels(rows, segments)
+    print("{} rows, {} labeled segments".format(rows, segments))
+
+    t_loop, loop_ranges = best_time(loop_label_ranges, column)
+    t_rle, rle_ranges = best_time(DataFile.get_label_ranges, column)
+    assert loop_ranges == rle_ranges
+    print("{:<28} loop {:9.1f} ms, rle {:7.2f} ms ({:.0f}x)".format(
+        "label ranges", t_loop * 1000, t_rle * 1000, t_loop / t_rle))
+
+    # Materialising all the label columns of the file, as when saving it
+    labels = [["Label", r] for r in rle_ranges]
+    subset = labels[:max(len(labels) // 50, 1)]  # the loop version is too slow for all of them
+    t_loop, loop_columns = best_time(lambda: [loop_label_series(l, rows) for l in subset])
+    t_rle, rle_columns = best_time(lambda: [rle_label_series(l, rows) for l in subset])
+    assert all((a.astype(np.uint8) == b).all() for a, b in zip(loop_columns, rle_columns))
+    print("{:<28} loop {:9.1f} ms, rle {:7.2f} ms ({:.0f}x), {:.1f} vs {:.1f} MB per column".format(
+        "label columns ({})".format(len(subset)), t_loop * 1000, t_rle * 1000, t_loop / t_rle,
+        loop_columns[0].memory_usage(deep=True) / 2**20, rle_columns[0].memory_usage(deep=True) / 2**20))
+
+    # Merged labels of the anomaly detection export, 3 channels (the loop version only on a short file)
+    new_labels = ["Anomaly_ch" + str(j) for j in range(CHANNELS)]
+    short_rows, short_segments = rows // 50, max(segments // 500, 1)
+    labels_list = make_channel_labels(short_rows, short_segments, CHANNELS)
+    columns = [loop_label_series(l, short_rows) for l in labels_list]
+    t_loop, loop_merged = best_time(loop_merge, labels_list, columns, new_labels, short_rows)
+    t_rle, rle_merged = best_time(make_datafile(short_rows, labels_list).merge_same_label_types, new_labels)
+    assert (loop_merged.astype(np.uint8).values == rle_merged.values).all()
+    print("{:<28} loop {:9.1f} ms, rle {:7.2f} ms ({:.0f}x)".format(
+        "merge ({} rows)".format(short_rows), t_loop * 1000, t_rle * 1000, t_loop / t_rle))
+
+    labels_list = make_channel_labels(rows, segments, CHANNELS)
+    t_rle, _ = best_time(make_datafile(rows, labels_list).merge_same_label_types, new_labels)
+    print("{:<28} rle {:7.2f} ms ({} segments)".format("merge ({} rows)".format(rows), t_rle * 1000, len(labels_list)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+# Least recently used cache of loaded files, bounded by the memory they hold rather than by their number.
+# Entries are tagged with a stamp (see config.get_file_stamp): a file changed on disk is never handed out.
+class DataFileCache:
+    def __init__(self, budget):
+        self.budget = budget  # bytes
+        self.entries = OrderedDict()  # key -> (stamp, datafile, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get_stamp(self, key):
+        return self.entries[key][0] if key in self.entries else None
+
+    def set_stamp(self, key, stamp):
+        _, datafile, size = self.entries[key]
+        self.entries[key] = (stamp, datafile, size)
+
+    def peek(self, key):
+        # The file of an entry, left in the cache
+        return self.entries[key][1] if key in self.entries else None
+
+    def take(self, key, stamp):
+        # The entry is removed: it is put back when the file is left, with any unsaved change
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, stamp, datafile):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[2]
+
+        size = datafile.get_memory_usage()
+        self.entries[key] = (stamp, datafile, size)
+        self.size += size
+        self.evict()
+
+    def evict(self):
+        # Least recently used first
+        while self.size > self.budget and self.entries:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.size -= size
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        ratio = 100 * self.hits / total if total else 0
+        return "{} hits, {} misses ({:.0f}% hit rate), {} files, {:.1f}/{:.0f} MB".format(
+            self.hits, self.misses, ratio, len(self.entries), self.size / 2**20, self.budget / 2**20)
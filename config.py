@@ -1,12 +1,20 @@
 import os
+import copy
 import json
 import logging
 from datafile import DataFile
 from formats.format import *
+from plotter import downsample, N_MAX
+from prefetch import Prefetcher
+from cache import DataFileCache
+from writer import Writer
 import dialogs
 from pathlib import Path
 
 PROJECT_CONFIG = "project.json"
+BINARY_COPY_EXT = ".tslb"
+LABELS_EXT = ".labels.json"
+STREAM_SIZE = 2**30  # files larger than this (bytes) are always streamed into a binary copy and mapped
 
 
 # Interacts with single file configurations
@@ -21,6 +29,8 @@ class FilesData:
 
         self.datafile = None
         self.config = None
+        self.cache = DataFileCache(get_cache_size() * 2**20)
+        self.prefetcher = Prefetcher(self.prefetch_file)
         self.init()
         self.read()
 
@@ -42,7 +52,7 @@ class FilesData:
                 "colors": ["#1f77b4"],
             }
             self.read_file()
-            self.config["plot"] = [[i] for i in self.datafile.get_data_columns()]
+            self.config["plot"] = [[i] for i in self.datafile.get_original_data_columns()]
             self.config["normalize"] = []
             self.config["functions"] = []
 
@@ -52,6 +62,7 @@ class FilesData:
 
     def read_conf(self):
         conf_path = self.config_list[self.current_file]
+        writer.wait(conf_path)
         try:
             with open(conf_path) as in_file:
                 self.config = json.load(in_file)
@@ -70,31 +81,96 @@ class FilesData:
             self.read_file()
             return
 
-        try:
-            self.datafile = DataFile(current, self.config["labels"])
-        except (UnrecognizedFormatError, BadFileError):
-            self.datafile = None
-            self.bad_files.append(current)
-            dialogs.notify_read_error(os.path.basename(current))
+        # a save of this file may still be in progress
+        writer.wait(current)
+        update_saved_stamps(self.cache)
 
-            self.next_file()
-            self.read_file()
+        labels = self.config["labels"]
+        stamp = get_file_stamp(current, labels)
+        self.datafile = self.cache.take(current, stamp)
+        if self.datafile is None:
+            self.datafile = self.prefetcher.take(self.current_file, stamp)
+        if self.datafile is None:
+            try:
+                self.datafile = self.load_file(self.current_file, labels)
+            except (UnrecognizedFormatError, BadFileError):
+                self.datafile = None
+                self.bad_files.append(current)
+                dialogs.notify_read_error(os.path.basename(current))
+
+                self.next_file()
+                self.read_file()
+                return
+        logger.debug("Files cache: {}".format(self.cache.get_stats()))
+        self.prefetch()
+
+    def load_file(self, index, labels):
+        # Labels saved on their own take precedence over those stored with the data
+        return read_labels(self.open_file(index, labels))
+
+    def open_file(self, index, labels):
+        current = self.files_list[index]
+        if use_memory_map(current):
+            return read_mapped(get_mapped_source(current), current, labels)
+        return DataFile(current, labels)
+
+    def get_file_labels(self, index):
+        # Labels of a file which is not the current one, from its own configuration (if any)
+        conf = read_json(self.config_list[index]) if self.config_list[index] else None
+        return conf["labels"] if conf else ["Label"]
+
+    def prefetch_file(self, index):
+        return prepare_datafile(self.load_file(index, self.get_file_labels(index)))
+
+    def prefetch(self):
+        update_saved_stamps(self.cache)
+        stamps = {}
+        for index in get_neighbours(self.current_file, len(self.files_list)):
+            current = self.files_list[index]
+            stamp = get_file_stamp(current, self.get_file_labels(index))
+            if current not in self.bad_files and self.cache.get_stamp(current) != stamp:
+                stamps[index] = stamp
+        self.prefetcher.schedule(stamps)
+
+    def keep_file(self):
+        # The file being left stays in memory, with its unsaved changes
+        if self.datafile is not None:
+            filename = self.datafile.filename
+            self.cache.put(filename, get_file_stamp(filename, self.config["labels"]), self.datafile)
 
     def save_file(self):
-        self.datafile.save()
+        # Written in the background, saving again before it is done only writes the latest version
+        writer.submit((self.datafile.filename, "save"), self.datafile.prepare_save())
+
+    def export_file(self):
+        writer.submit((self.datafile.filename, "export"), self.datafile.prepare_export())
 
     def save_config(self):
         if self.modified:
             conf_path = self.files_list[self.current_file] + ".json"
-            try:
-                with open(conf_path, 'w') as out_file:
-                    json.dump(self.config, out_file)
-            except IOError:
-                logger.error("Unable to write {}: permission denied".format(conf_path))
-                exit(2)
+            conf = copy.deepcopy(self.config)
+            writer.submit((conf_path, "config"), lambda: write_json(conf, conf_path))
             self.config_list[self.current_file] = conf_path
             self.modified = False
 
+    def mark_unsaved(self, path, kind):
+        # A background save of path failed: it is saved again with the next changes. True for the current file
+        # (its changes are tracked by the interface)
+        if kind == "config":
+            self.modified = self.modified or path == self.files_list[self.current_file] + ".json"
+            return False
+        if self.datafile is not None and str(self.datafile.filename) == path:
+            return True
+        datafile = self.cache.peek(path)
+        if datafile is not None:
+            datafile.modified = True
+        return False
+
+    def close(self):
+        # End of the session: files are no longer loaded in the background, nor kept in memory
+        self.prefetcher.shutdown()
+        self.cache.clear()
+
     def next_label(self):
         self.current_label = (self.current_label + 1) % len(self.config["labels"])
 
@@ -135,32 +211,40 @@ class FilesData:
         self.modified = True
 
     def next_file(self):
+        self.keep_file()
         self.current_file = (self.current_file + 1) % len(self.files_list)
 
     def prev_file(self):
+        self.keep_file()
         self.current_file = (self.current_file - 1 + len(self.files_list)) % len(self.files_list)
 
     def get_functions(self):
+        return [get_function_name(spec) for spec in self.config["functions"]]
+
+    def get_function_specs(self):
         return self.config["functions"]
 
-    def add_function(self, fs):
-        self.datafile.add_function(fs)
-        self.config["functions"].append(fs.name)
+    def add_function(self, fs, spec=None):
+        self.datafile.add_function(fs, get_function_sources(spec)[0] if spec is not None else None)
+        self.config["functions"].append(spec if spec is not None else fs.name)
         self.modified = True
 
     def remove_function(self, index):
-        f_name = self.config["functions"][index]
+        f_name = get_function_name(self.config["functions"][index])
 
         header = self.datafile.get_data_header()
-        f_col = self.datafile.get_data_columns()[header.index(f_name)]
-        for plot in self.config["plot"]:
-            if f_col in plot:
-                plot.remove(f_col)
-            for i, col in enumerate(plot):
-                if col > f_col:
-                    plot[i] = col - 1
-
+        # the last column first: the indexes of the previous ones do not change
+        for name in reversed(self.datafile.get_function_set(f_name)):
+            if name in header:
+                f_col = self.datafile.get_data_columns()[header.index(name)]
+                for plot in self.config["plot"]:
+                    if f_col in plot:
+                        plot.remove(f_col)
+                    for i, col in enumerate(plot):
+                        if col > f_col:
+                            plot[i] = col - 1
         self.datafile.remove_function(f_name)
+
         del self.config["functions"][index]
         self.modified = True
 
@@ -177,6 +261,8 @@ class ProjectData:
 
         self.datafile = None
         self.config = None
+        self.cache = DataFileCache(get_cache_size() * 2**20)
+        self.prefetcher = Prefetcher(self.prefetch_file)
         self.read_conf()
         self.read_file()
 
@@ -190,6 +276,7 @@ class ProjectData:
             self.current_label = 0
 
     def read_conf(self):
+        writer.wait(self.project_file)
         try:
             with open(self.project_file) as in_file:
                 self.config = json.load(in_file)
@@ -204,22 +291,19 @@ class ProjectData:
 
         current = self.config["files"][self.current_file]
         file_path = os.path.join(self.folder, current)
-        file_path_tsl = file_path
 
-        #create potential tls_generated file name
-        file_path_tsl = Path(file_path)
-        file_path_tsl = file_path_tsl.parent / 'tsl_generated' / file_path_tsl.name
+        # a save of this file may still be in progress
+        writer.wait(file_path)
+        update_saved_stamps(self.cache)
 
-        try:
-            #try reading tsl_generated file if exists
-            self.datafile = DataFile(file_path_tsl, self.config["labels"])
-            self.datafile.filename = file_path
-            self.insert_header()
-        except:
-            #if there is no tsl_generated file yet, read normal file type
+        labels = self.config["labels"]
+        stamp = get_file_stamp(file_path, labels)
+        self.datafile = self.cache.take(file_path, stamp)
+        if self.datafile is None:
+            self.datafile = self.prefetcher.take(self.current_file, stamp)
+        if self.datafile is None:
             try:
-                self.datafile = DataFile(file_path, self.config["labels"])
-                self.insert_header()
+                self.datafile = self.load_file(self.current_file, labels)
             except (UnrecognizedFormatError, BadFileError):
                 #thow error if format is not recognized
                 self.datafile = None
@@ -227,12 +311,43 @@ class ProjectData:
                 dialogs.notify_read_error(current)
                 self.next_file()
                 self.read_file()
+                return
+        logger.debug("Files cache: {}".format(self.cache.get_stats()))
+        self.insert_header()
+        self.prefetch()
+
+    def load_file(self, index, labels):
+        # Labels saved on their own take precedence over those stored with the data (and apply to the resampled file)
+        return read_labels(resample_project_file(self.open_file(index, labels), self.config))
+
+    def open_file(self, index, labels):
+        return open_project_file(os.path.join(self.folder, self.config["files"][index]), labels)
+
+    def prefetch_file(self, index):
+        return prepare_datafile(self.load_file(index, self.config["labels"]))
+
+    def prefetch(self):
+        update_saved_stamps(self.cache)
+        stamps = {}
+        for index in get_neighbours(self.current_file, len(self.config["files"])):
+            current = self.config["files"][index]
+            file_path = os.path.join(self.folder, current)
+            stamp = get_file_stamp(file_path, self.config["labels"])
+            if current not in self.bad_files and self.cache.get_stamp(file_path) != stamp:
+                stamps[index] = stamp
+        self.prefetcher.schedule(stamps)
+
+    def keep_file(self):
+        # The file being left stays in memory, with its unsaved changes
+        if self.datafile is not None:
+            filename = self.datafile.filename
+            self.cache.put(filename, get_file_stamp(filename, self.config["labels"]), self.datafile)
 
     def insert_header(self):
-        header = self.datafile.get_data_header()
+        header = self.datafile.get_original_header()
         if str(header) not in self.config.keys():
             self.config[str(header)] = {
-                "plot": [[i] for i in self.datafile.get_data_columns()],
+                "plot": [[i] for i in self.datafile.get_original_data_columns()],
                 "normalize": [],
                 "functions": []
             }
@@ -240,18 +355,36 @@ class ProjectData:
             self.save_config()
 
     def save_file(self):
-        self.datafile.save()
+        # Written in the background, saving again before it is done only writes the latest version
+        writer.submit((self.datafile.filename, "save"), self.datafile.prepare_save())
+
+    def export_file(self):
+        writer.submit((self.datafile.filename, "export"), self.datafile.prepare_export())
 
     def save_config(self):
         if self.modified:
-            try:
-                with open(self.project_file, 'w') as out_file:
-                    json.dump(self.config, out_file)
-            except IOError:
-                logger.error("Unable to write {}: permission denied".format(self.project_file))
-                exit(2)
+            conf = copy.deepcopy(self.config)
+            writer.submit((self.project_file, "config"), lambda: write_json(conf, self.project_file))
             self.modified = False
 
+    def mark_unsaved(self, path, kind):
+        # A background save of path failed: it is saved again with the next changes. True for the current file
+        # (its changes are tracked by the interface)
+        if kind == "config":
+            self.modified = self.modified or path == str(self.project_file)
+            return False
+        if self.datafile is not None and str(self.datafile.filename) == path:
+            return True
+        datafile = self.cache.peek(path)
+        if datafile is not None:
+            datafile.modified = True
+        return False
+
+    def close(self):
+        # End of the session: files are no longer loaded in the background, nor kept in memory
+        self.prefetcher.shutdown()
+        self.cache.clear()
+
     def next_label(self):
         self.current_label = (self.current_label + 1) % len(self.config["labels"])
 
@@ -286,51 +419,60 @@ class ProjectData:
         if self.current_label >= len(names):
             self.current_label = 0
 
+    def get_conf(self):
+        # Configuration shared by the files with the same columns (function columns are added from it)
+        return self.config[str(self.datafile.get_original_header())]
+
     def get_plot_info(self):
-        header = self.datafile.get_data_header()
-        conf = self.config[str(header)]
+        conf = self.get_conf()
         return conf["plot"], conf["normalize"]
 
     def set_plot_info(self, plot_set, normalize):
-        header = self.datafile.get_data_header()
-        conf = self.config[str(header)]
+        conf = self.get_conf()
         conf["plot"] = plot_set
         conf["normalize"] = normalize
         self.modified = True
 
     def next_file(self):
+        self.keep_file()
         self.current_file = (self.current_file + 1) % len(self.config["files"])
 
     def prev_file(self):
+        self.keep_file()
         self.current_file = (self.current_file - 1 + len(self.config["files"])) % len(self.config["files"])
 
     def get_functions(self):
-        header = self.datafile.get_data_header()
-        return self.config[str(header)]["functions"]
+        return [get_function_name(spec) for spec in self.get_conf()["functions"]]
 
-    def add_function(self, fs):
-        header = self.datafile.get_data_header()
-        new_header = header + [fs.name]
-        self.config[str(new_header)] = self.config[str(header)]
-        self.config[str(new_header)]["functions"].append(fs.name)
+    def get_function_specs(self):
+        return self.get_conf()["functions"]
 
-        self.datafile.add_function(fs)
+    def add_function(self, fs, spec=None):
+        self.get_conf()["functions"].append(spec if spec is not None else fs.name)
+        self.datafile.add_function(fs, get_function_sources(spec)[0] if spec is not None else None)
+        self.modified = True
+
+    def add_project_function(self, spec, headers):
+        insert_project_function(self.config, spec, headers)
         self.modified = True
 
     def remove_function(self, index):
         header = self.datafile.get_data_header()
-        conf = self.config[str(header)]
-
-        f_name = conf["functions"][index]
-        f_col = self.datafile.get_data_columns()[header.index(f_name)]
-        for plot in conf["plot"]:
-            if f_col in plot:
-                plot.remove(f_col)
-            for i, col in enumerate(plot):
-                if col > f_col:
-                    plot[i] = col - 1
-
+        conf = self.get_conf()
+
+        f_name = get_function_name(conf["functions"][index])
+        # the last column first: the indexes of the previous ones do not change
+        for name in reversed(self.datafile.get_function_set(f_name)):
+            if name in header:
+                f_col = self.datafile.get_data_columns()[header.index(name)]
+                for plot in conf["plot"]:
+                    if f_col in plot:
+                        plot.remove(f_col)
+                    for i, col in enumerate(plot):
+                        if col > f_col:
+                            plot[i] = col - 1
         self.datafile.remove_function(f_name)
+
         del conf["functions"][index]
         self.modified = True
 
@@ -339,9 +481,15 @@ class Config:
     def __init__(self):
         self.path = None
         self.config = None
-        self.default = {"autosave": False, "plot_height": 1.06}
+        self.default = {"autosave": False, "plot_height": 1.06, "prefetch": 1, "cache_size": 512,
+                        "binary_copy": False, "memory_map": False, "labels_only": False,
+                        "function_store": False}
         self.init()
 
+        # Options added after the configuration file was first written
+        for key, value in self.default.items():
+            self.config.setdefault(key, value)
+
     def init(self):
         default_path = './config.json'
         alternative_path = os.path.expanduser('~/.config/tsl/config.json')
@@ -390,16 +538,171 @@ def read_json(path):
 
 def write_json(data, path):
     try:
-        with open(path, 'w') as out_file:
+        with atomic_file(path) as tmp_path, open(tmp_path, 'w') as out_file:
             json.dump(data, out_file)
-            return True
+        return True
     except IOError:
         logger.error("Unable to write {}: permission denied".format(path))
         return False
 
 
+def get_generated_path(file_path, ext=None):
+    # tsl_generated copy of a file (with another extension, if given)
+    path = Path(file_path)
+    if path.parent.name != 'tsl_generated':
+        path = path.parent / 'tsl_generated' / path.name
+    return path.with_suffix(ext) if ext else path
+
+
+def get_generated_files(file_path):
+    # tsl_generated copies of a file, to be tried in order: the binary one only if not older than the CSV one
+    file_path_tsl = get_generated_path(file_path)
+    file_path_bin = get_generated_path(file_path, BINARY_COPY_EXT)
+
+    generated = [file_path_tsl] if file_path_tsl.exists() else []
+    if file_path_bin.exists():
+        if not generated or file_path_bin.stat().st_mtime >= file_path_tsl.stat().st_mtime:
+            generated.insert(0, file_path_bin)
+    return generated
+
+
+def get_mapped_source(file_path):
+    # Binary copy of a single file if up to date, the file itself otherwise
+    file_path_bin = get_generated_path(file_path, BINARY_COPY_EXT)
+    if file_path_bin.exists() and file_path_bin.stat().st_mtime >= os.path.getmtime(file_path):
+        return file_path_bin
+    return Path(file_path)
+
+
+def read_mapped(source, file_path, labels):
+    # Converts source into the binary copy of file_path (unless it already is) and maps it
+    file_path_bin = get_generated_path(file_path, BINARY_COPY_EXT)
+    if Path(source) != file_path_bin:
+        DataFile.convert(str(source), str(file_path_bin))
+
+    datafile = DataFile(file_path_bin, labels, mapped=True)
+    datafile.filename = file_path
+    return datafile
+
+
+def open_project_file(file_path, labels):
+    # Reads a file of a project from its most recent copy (see also batch, which reads them in other processes)
+    if use_memory_map(file_path):
+        generated = get_generated_files(file_path)
+        try:
+            #map the binary copy of the most recent file, converting it if needed
+            return read_mapped(generated[0] if generated else file_path, file_path, labels)
+        except:
+            pass
+
+    for file_path_tsl in get_generated_files(file_path):
+        try:
+            #try reading tsl_generated file if exists
+            datafile = DataFile(file_path_tsl, labels)
+            datafile.filename = file_path
+            return datafile
+        except:
+            continue
+
+    #if there is no tsl_generated file yet, read normal file type
+    return DataFile(file_path, labels)
+
+
+def resample_project_file(datafile, project):
+    # Files of a project with a common rate are resampled to it on load, those without timestamps being at the
+    # rate of the project (see DataFile.resample), which is also their rate for the functions otherwise
+    datafile.set_sample_rate(project.get("sample_rate"))
+    if project.get("resample"):
+        datafile.resample(project["resample"], project.get("sample_rate"))
+    return datafile
+
+
+def read_labels(datafile):
+    # Replaces the labels of a file with those of its labels-only save, if any
+    labels_path = get_generated_path(datafile.filename, LABELS_EXT)
+    if not labels_path.exists():
+        return datafile
+
+    saved = read_json(labels_path)
+    if saved is None or saved["rows"] != datafile.get_shape():
+        logger.warning("Ignoring {}: it does not match the data file".format(labels_path))
+        return datafile
+    datafile.labels_list = [[key, tuple(r)] + extra for key, r, *extra in saved["labels"]]
+    return datafile
+
+
+def get_file_stamp(file_path, labels):
+    # Everything a loaded file depends on: the files it may be read from and the settings used to read it
+    return get_file_mtimes(file_path), tuple(labels), use_memory_map(file_path)
+
+
+def get_file_mtimes(file_path):
+    paths = [Path(file_path), get_generated_path(file_path), get_generated_path(file_path, BINARY_COPY_EXT),
+             get_generated_path(file_path, LABELS_EXT)]
+    return tuple(path.stat().st_mtime if path.exists() else None for path in paths)
+
+
+def update_saved_stamps(cache):
+    # Files saved in the background were cached before being written: they are as recent as the new copies
+    for file_path in writer.pop_written():
+        stamp = cache.get_stamp(file_path)
+        if stamp is not None:
+            cache.set_stamp(file_path, (get_file_mtimes(file_path),) + stamp[1:])
+
+
+def use_memory_map(file_path):
+    # Files too large to be loaded are mapped even if not required in the settings
+    return get_memory_map() or (os.path.isfile(file_path) and os.path.getsize(file_path) > STREAM_SIZE)
+
+
+def get_function_name(spec):
+    # Functions are stored as {"function", "name", "source" (or "sources"), "parameters"}, or only by name in older
+    # configurations
+    return spec if isinstance(spec, str) else spec["name"]
+
+
+def get_function_sources(spec):
+    # Source columns of a function: a list for functions of several sources, a single one otherwise
+    return spec["sources"] if "sources" in spec else [spec["source"]]
+
+
+def insert_project_function(project, spec, headers):
+    # Function applied to all the files of a project (see batch): added to the configuration of each header it was
+    # computed for, header -> data columns (to initialise the configuration of headers not seen yet)
+    for header, columns in headers.items():
+        conf = project.setdefault(header, {"plot": [[i] for i in columns], "normalize": [], "functions": []})
+        if spec["name"] not in [get_function_name(f) for f in conf["functions"]]:
+            conf["functions"].append(copy.deepcopy(spec))
+
+
+def get_neighbours(index, length):
+    # Indexes of the files around index, closest first, within the prefetch depth
+    neighbours = []
+    for k in range(1, get_prefetch_depth() + 1):
+        for i in ((index + k) % length, (index - k) % length):
+            if i != index and i not in neighbours:
+                neighbours.append(i)
+    return neighbours
+
+
+def prepare_datafile(datafile):
+    # Downsampled plot series of a file, computed in advance (e.g. while prefetching)
+    for column in datafile.get_data_columns():
+        name = datafile.df.columns[column]
+        if datafile.summary is not None and name in datafile.summary.pyramids:
+            # Already reduced while the file was summarised: no need to read it again
+            sampled = datafile.summary.pyramids[name].downsample(0, datafile.get_shape(), N_MAX, name)
+        else:
+            sampled = downsample(datafile.df.iloc[:, column], datafile.mapped)
+        if sampled is not None:
+            datafile.sampled[column] = sampled
+    return datafile
+
+
 def start_session(files=None, project=None):
     global data_config
+    if data_config is not None:
+        data_config.close()
     if files:
         data_config = FilesData(files)
     elif project:
@@ -452,6 +755,7 @@ except IOError:
 
 tsl_config = Config()
 data_config = None
+writer = Writer(logger)
 
 
 # CONFIGURATION WRAPPERS
@@ -475,11 +779,50 @@ def get_plot_height():
     return tsl_config.config["plot_height"]
 
 
-def set_tsl_config(autosave=None, plot_height=None):
+def get_prefetch_depth():
+    return tsl_config.config["prefetch"]
+
+
+def get_cache_size():
+    return tsl_config.config["cache_size"]
+
+
+def get_binary_copy():
+    return tsl_config.config["binary_copy"]
+
+
+def get_memory_map():
+    return tsl_config.config["memory_map"]
+
+
+def get_labels_only():
+    return tsl_config.config["labels_only"]
+
+
+def get_function_store():
+    return tsl_config.config["function_store"]
+
+
+def set_tsl_config(autosave=None, plot_height=None, prefetch=None, cache_size=None, binary_copy=None, memory_map=None,
+                   labels_only=None, function_store=None):
     if autosave is not None:
         tsl_config.config["autosave"] = autosave
     if plot_height is not None:
         tsl_config.config["plot_height"] = plot_height
+    if prefetch is not None:
+        tsl_config.config["prefetch"] = prefetch
+    if cache_size is not None:
+        tsl_config.config["cache_size"] = cache_size
+        if data_config is not None:
+            data_config.cache.set_budget(cache_size * 2**20)
+    if binary_copy is not None:
+        tsl_config.config["binary_copy"] = binary_copy
+    if memory_map is not None:
+        tsl_config.config["memory_map"] = memory_map
+    if labels_only is not None:
+        tsl_config.config["labels_only"] = labels_only
+    if function_store is not None:
+        tsl_config.config["function_store"] = function_store
 
 
 def save_tsl_config():
@@ -518,6 +861,23 @@ def get_functions():
     return data_config.get_functions()
 
 
+def get_function_specs():
+    return data_config.get_function_specs()
+
+
+def is_project():
+    return isinstance(data_config, ProjectData)
+
+
+def get_project():
+    # Folder and configuration of the project, a copy to be read while the session goes on
+    return data_config.folder, copy.deepcopy(data_config.config)
+
+
+def add_project_function(spec, headers):
+    data_config.add_project_function(spec, headers)
+
+
 def is_modified():
     return data_config.modified
 
@@ -542,6 +902,27 @@ def save_file():
     data_config.save_file()
 
 
+def is_saving():
+    return writer.is_busy()
+
+
+def wait_saves():
+    writer.wait()
+
+
+def pop_failed_saves():
+    # Files whose background save failed since last asked, and whether the current one is among them
+    failed = writer.pop_failed()
+    current = False
+    for path, kind in failed:
+        current = data_config is not None and data_config.mark_unsaved(path, kind) or current
+    return sorted(set(path for path, _ in failed)), current
+
+
+def export_file():
+    data_config.export_file()
+
+
 def next_file():
     data_config.next_file()
 
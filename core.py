@@ -1,6 +1,6 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon, QColor, QPixmap
-from PyQt5.QtWidgets import QSizePolicy, QPushButton, QWidget
+from PyQt5.QtWidgets import QSizePolicy, QPushButton, QWidget, QLabel
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
@@ -10,11 +10,13 @@ import matplotlib.dates as mdates
 
 from plotter import Plotter, get_nearest_index
 from popup import RightClickMenu
+from functions.controller import FunctionController
 import config
 import dialogs
 
 MOUSE_RIGHT = 3
 MOUSE_LEFT = 1
+SAVING_POLL = 200  # ms between checks of the background saves
 
 
 # Implements the core functions of the application
@@ -45,30 +47,61 @@ class PlotCore:
         self.redraw()
 
     def plot(self):
+        # functions of the configuration are computed the first time the file is shown
+        FunctionController.apply_pipeline()
         datafile = config.get_datafile()
         plot_set, normalize = config.get_plot_info()
-        header = list(datafile.df)
 
         n_sub = len(plot_set)
         grid = GridSpec(n_sub, 1, left=0.08, right=0.92, top=0.99, bottom=0.04, hspace=0.1)
-        self.timestamp = [mdates.date2num(date) for date in datafile.get_timestamp()]
+        self.timestamp = mdates.date2num(datafile.get_timestamp())
 
         for i in range(n_sub):
-            norm = bool(i in normalize)
-            draw_set = [datafile.df[header[j]] for j in plot_set[i]]
-
             subplot = self.figure.add_subplot(grid[i])
-            plotter = Plotter(subplot, draw_set, self.timestamp, norm)
             self.subplots.append(subplot)
-            self.plotters.append(plotter)
-
+            self.plotters.append(self.make_plotter(subplot, plot_set[i], bool(i in normalize)))
             subplot.set_xticklabels([]) if i < n_sub-1 else None
-            subplot.legend(loc=1, prop={'size': 8}) if draw_set else None
 
         self.manage_empty()
         self.insert_labels()
         self.canvas.refresh()
 
+    def make_plotter(self, subplot, columns, norm):
+        datafile = config.get_datafile()
+        header = list(datafile.df)
+        draw_set = [datafile.df[header[j]] for j in columns]
+        sampled_set = [datafile.sampled[j] for j in columns if j in datafile.sampled]
+        sampled_set = sampled_set if draw_set and len(sampled_set) == len(draw_set) else None
+        markers = [datafile.get_markers(header[j]) for j in columns]
+        pyramids = [datafile.summary.pyramids.get(header[j]) if datafile.summary is not None else None
+                    for j in columns]
+        stats = [datafile.summary.get_statistics(header[j]) if datafile.summary is not None else None
+                 for j in columns]
+        ranges = [(s["min"], s["max"]) if s is not None else None for s in stats]
+
+        plotter = Plotter(subplot, draw_set, self.timestamp, norm, datafile.mapped, sampled_set, markers, pyramids,
+                          ranges)
+        subplot.legend(loc=1, prop={'size': 8}) if draw_set else None
+        return plotter
+
+    def redraw_columns(self, names):
+        # Only the subplots showing the given columns are drawn again (e.g. a function just added), at the same
+        # range. Nothing to do if they are not plotted
+        header = list(config.get_datafile().df)
+        plot_set, normalize = config.get_plot_info()
+        indexes = [i for i, columns in enumerate(plot_set)
+                   if i < len(self.subplots) and any(header[j] in names for j in columns if j < len(header))]
+        for i in indexes:
+            subplot = self.subplots[i]
+            x_lim = subplot.get_xlim()
+            subplot.cla()
+            self.plotters[i] = self.make_plotter(subplot, plot_set[i], bool(i in normalize))
+            subplot.set_xlim(x_lim)
+            subplot.set_xticklabels([]) if i < len(self.subplots)-1 else None
+        if indexes:
+            self.insert_labels(indexes)
+            self.canvas.refresh()
+
     def subplot_event(self, event_axes):
         subplot_number = 0
         #get subplot index where event is happening
@@ -84,7 +117,7 @@ class PlotCore:
         datafile = config.get_datafile()
         label, color = config.get_current_label()
 
-        if not self.timestamp:
+        if not len(self.timestamp):
             n_rows = datafile.get_shape()
             a = max(int(round(x1)), 0)
             b = max(int(round(x2)), 0)
@@ -164,10 +197,11 @@ class PlotCore:
         else:
             return index[-1], plot_number
 
-    def insert_labels(self):
+    def insert_labels(self, indexes=None):
+        # on the given subplots only, if any
         datafile = config.get_datafile()
         for lab in datafile.labels_list:
-            if self.timestamp:
+            if len(self.timestamp):
                 x1 = self.timestamp[lab[1][0]]
                 x2 = self.timestamp[lab[1][1]]
                 if x1 == x2:
@@ -182,6 +216,8 @@ class PlotCore:
                     x2 = x2 + 0.5
 
             for index, plot in enumerate(self.plotters):
+                if indexes is not None and index not in indexes:
+                    continue
                 if (self.is_channel_independent == 'true'):
                     if(('ch' + str(index)) in lab[0]):
                         #add rect only for the right plot
@@ -276,7 +312,7 @@ class PlotCanvas(FigureCanvas):
         self.draw()
 
     def same_index(self, new_x):
-        if not self.core.timestamp:
+        if not len(self.core.timestamp):
             datafile = config.get_datafile()
             n_rows = datafile.get_shape()
             x1 = max(int(round(self.prev_x)), 0)
@@ -359,8 +395,9 @@ class PlotCanvas(FigureCanvas):
 
     def reset(self):
         self.prev_x = None
-        self.modified = False
         self.core.reset()
+        # a cached file may have unsaved changes
+        self.modified = config.get_datafile().modified
         self.labeler.update_dimensions()
         self.labeler.update_functions()
 
@@ -369,6 +406,12 @@ class PlotCanvas(FigureCanvas):
         config.save_data_config()
         self.modified = False
 
+    def export(self):
+        # Full labeled files, even when only the labels are saved
+        config.export_file()
+        config.save_data_config()
+        self.modified = False
+
     def next_label(self):
         config.next_label()
         self.toolbar.update_label()
@@ -385,6 +428,7 @@ class PlotCanvas(FigureCanvas):
                 answer = dialogs.ask_to_continue()
                 if not answer:
                     return
+        config.get_datafile().modified = self.modified
         config.next_file()
         self.reset()
 
@@ -396,6 +440,7 @@ class PlotCanvas(FigureCanvas):
                 answer = dialogs.ask_to_continue()
                 if not answer:
                     return
+        config.get_datafile().modified = self.modified
         config.prev_file()
         self.reset()
 
@@ -407,8 +452,21 @@ class PlotCanvas(FigureCanvas):
                 answer = dialogs.ask_to_continue()
                 if not answer:
                     return
+        # saves still in progress are completed
+        config.wait_saves()
+        if self.check_saves():
+            return
         exit(0)
 
+    def check_saves(self):
+        # Background saves which failed: the user is told, and asked again before leaving the file
+        files, current = config.pop_failed_saves()
+        if current:
+            self.modified = True
+        if files:
+            dialogs.notify_save_error(files)
+        return bool(files)
+
 
 # noinspection PyArgumentList
 class PlotToolbar(NavigationToolbar):
@@ -424,6 +482,9 @@ class PlotToolbar(NavigationToolbar):
         )
         super().__init__(canvas, root, False)
         self.label_button = None
+        self.saving_label = None
+        self.saving_action = None
+        self.saving_timer = None
         self.init()
 
     def init(self):
@@ -435,12 +496,25 @@ class PlotToolbar(NavigationToolbar):
         self.label_button.setStyleSheet("padding: 10px 12px; height: 13px;")
         self.label_button.clicked.connect(self.canvas.next_label)
 
+        # Shown while files are being saved in the background
+        self.saving_label = QLabel("Saving...", self)
+        self.saving_label.setStyleSheet("color: gray; padding-right: 10px;")
+        self.saving_timer = QTimer(self)
+        self.saving_timer.timeout.connect(self.update_saving)
+        self.saving_timer.start(SAVING_POLL)
+
         spacer = QWidget()
         spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.addWidget(spacer)
+        self.saving_action = self.addWidget(self.saving_label)
+        self.saving_action.setVisible(False)
         self.addWidget(self.label_button)
         self.layout().setSpacing(5)
 
+    def update_saving(self):
+        self.saving_action.setVisible(config.is_saving())
+        self.canvas.check_saves()
+
     def home(self):
         self.canvas.reset()
 
@@ -1,18 +1,32 @@
 import os
+import copy
+import numpy as np
 import pandas as pd
 import config
 from pathlib import Path
 from formats.format import *
+from summary import ChunkSummary, get_runs
+from plotter import downsample
+from resampling import get_factors, get_rate, get_timestamps, remap_range, resample_values, get_deltas
 
 TIMESTAMP = 'Timestamp'
 
 
 class DataFile:
-    def __init__(self, filename, labels):
+    def __init__(self, filename, labels, mapped=False):
         self.filename = filename
+        self.mapped = mapped  # columns are memory-mapped views of the file, not in-memory copies
 
         self.df = None
         self.labels_list = []
+        self.sampled = {}  # column -> downsampled series for plotting, if computed in advance
+        self.modified = False  # unsaved changes, kept while the file is cached
+        self.summary = None  # statistics, label ranges and pyramids built chunk by chunk (mapped files only)
+        self.functions = []  # names of the columns computed by functions, after the original ones
+        self.markers = {}  # function column -> (source column, indexes of the samples marked by the function)
+        self.function_sets = {}  # function -> its columns, for functions computing several ones (e.g. a spectrum)
+        self.time = None  # (index, deltas) of the samples, shared by the series to process (see get_time)
+        self.sample_rate = None  # Hz, of the samples if there are no timestamps (project option)
 
         ext = os.path.splitext(filename)[1]
         self.io = get_format(ext)
@@ -22,17 +36,40 @@ class DataFile:
             raise UnrecognizedFormatError
 
         self.read()
+        if self.mapped:
+            self.summary = self.summarise(labels)
         self.update_labels_list(labels)
 
     def read(self):
-        self.df = self.io.read(self.filename)
+        self.df = self.io.map(self.filename) if self.mapped else self.io.read(self.filename)
         if self.df is None:
             config.logger.error("Cannot read file {}, is it structured correctly?".format(self.filename))
             raise BadFileError
 
+        if self.io.timings:
+            stages = ", ".join("{} {:.1f} ms".format(k, v * 1000) for k, v in self.io.timings.items())
+            config.logger.debug("Read {} ({})".format(os.path.basename(str(self.filename)), stages))
+
+    def summarise(self, labels):
+        # One pass over the file in chunks: the mapped pages can be dropped again as soon as they are used
+        summary = ChunkSummary(lambda key: ''.join(labels) in key)
+        for chunk in self.io.read_chunks(self.filename):
+            summary.add(chunk)
+        return summary.finish()
+
     def get_shape(self):
         return self.df.shape[0]
 
+    def get_memory_usage(self):
+        # Bytes held in memory: memory-mapped columns are backed by the file instead
+        size = sum(ts.memory_usage(index=False, deep=True) for ts in self.sampled.values())
+        for i in range(self.df.shape[1]):
+            column = self.df.iloc[:, i]
+            values = column.values
+            if not isinstance(values, np.memmap) and not isinstance(getattr(values, 'base', None), np.memmap):
+                size += column.memory_usage(index=False, deep=True)
+        return size
+
     def get_data_columns(self):
         data_col = []
         for i, key in enumerate(self.df):
@@ -41,20 +78,20 @@ class DataFile:
         return data_col
 
     def get_original_columns(self):
-        functions = config.get_functions()
-
         orig_col = []
         for i, key in enumerate(self.df):
-            if key not in functions:
+            if key not in self.functions:
                 orig_col.append(i)
         return orig_col
 
-    def get_function_columns(self):
-        functions = config.get_functions()
+    def get_original_data_columns(self):
+        # Data columns read from the file: a cached file may still hold the functions of a discarded configuration
+        return [i for i in self.get_data_columns() if self.df.columns[i] not in self.functions]
 
+    def get_function_columns(self):
         func_col = []
         for i, key in enumerate(self.df):
-            if key in functions:
+            if key in self.functions:
                 func_col.append(i)
         return func_col
 
@@ -65,6 +102,9 @@ class DataFile:
                 col_names.append(key)
         return col_names
 
+    def get_original_header(self):
+        return [key for key in self.get_data_header() if key not in self.functions]
+
     def get_timestamp(self):
         if TIMESTAMP not in list(self.df):
             return []
@@ -72,27 +112,18 @@ class DataFile:
 
     @staticmethod
     def get_label_ranges(label_col):
-        ranges = []
-        start = None
-
-        for i, val in enumerate(label_col):
-            if val == 1.0 and start is None:
-                start = i
-            elif val != 1.0 and start is not None:
-                ranges.append((start, i - 1))
-                start = None
-
-        if start is not None:  # Handle case where the range ends at the last element
-            ranges.append((start, len(label_col) - 1))
-
-        return ranges
+        # (first, last) index of each run of labeled samples
+        starts, ends = get_runs(np.asarray(label_col) == 1)
+        return list(zip(starts.tolist(), ends.tolist()))
 
     def update_labels_list(self, labels):
         self.labels_list = []
         for i, key in enumerate(list(self.df)):
             if ''.join(labels) in key:
-                data = self.df.iloc[:, i]
-                ranges = self.get_label_ranges(data)
+                if self.summary is not None and key in self.summary.label_ranges:
+                    ranges = self.summary.label_ranges[key]
+                else:
+                    ranges = self.get_label_ranges(self.df.iloc[:, i])
                 for r in ranges:
                     self.labels_list.append([key, r])
                 # For individual channel labeling, some series may not have any labels
@@ -108,21 +139,16 @@ class DataFile:
         a = label[1][0]
         b = label[1][1] + 1
         n_rows = self.get_shape()
-        s = pd.Series(n_rows * ['0'], name=label[0])
-        for i in range(a, b):
-            try:
-                s.iat[i] = '1'
-            except:
-                #selection on the plot goes beyond array size due to the existent visual margin; ignore
-                pass
-        return s
-
-    def merge_same_label_types(self, columns):
+        values = np.zeros(n_rows, dtype=np.uint8)
+        #selection on the plot may go beyond array size due to the existent visual margin: clipped
+        values[max(a, 0):b] = 1
+        return pd.Series(values, name=label[0])
+
+    @staticmethod
+    def get_merged_label_names():
         available_labels, _       = config.get_labels_info()
         _, is_channel_independent = config.get_additional_options()
         plots_number, _           = config.get_plot_info()
-        n_rows                    = self.get_shape()
-        new_columns = []
         new_labels  = []
 
         if is_channel_independent == 'true':
@@ -133,85 +159,242 @@ class DataFile:
         else:
             #do not modify labels
             new_labels = available_labels
+        return new_labels
+
+    def merge_same_label_types(self, new_labels):
+        # Logical OR of all the intervals of each label type, without materialising them one by one
+        n_rows      = self.get_shape()
+        new_columns = []
 
         for label in new_labels:
-            new_column = pd.Series(n_rows * ['0'], name=label)
-            #get columns for the same label type - to be merged
-            column_index = [j for j, entry in enumerate(self.labels_list) if entry[0] == label]
-            #if multiple columns for the same label, merge to a new column
-            if len(column_index):
-                for row in range(0, len(new_column)):
-                    #loop through each row in the column matrix
-                    for index in column_index:
-                        if columns[index][row] == '1':
-                            new_column[row] = '1'
-                            break
-            new_columns.append(new_column)
+            ranges = np.array([entry[1] for entry in self.labels_list if entry[0] == label], dtype=np.int64)
+            ranges = ranges.reshape(-1, 2)
+            #selection on the plot may go beyond array size due to the existent visual margin: clipped
+            starts = np.clip(ranges[:, 0], 0, n_rows)
+            stops = np.clip(ranges[:, 1] + 1, 0, n_rows)
+            valid = starts < stops
+            #number of intervals covering each row
+            coverage = np.zeros(n_rows + 1, dtype=np.int64)
+            np.add.at(coverage, starts[valid], 1)
+            np.add.at(coverage, stops[valid], -1)
+            values = (np.cumsum(coverage[:-1]) > 0).astype(np.uint8)
+            new_columns.append(pd.Series(values, name=label))
         return pd.concat(new_columns, axis=1)
 
-    def labels_list_to_df(self):
+    def labels_list_to_df(self, default_label):
         if not self.labels_list:
-            available_labels, _  = config.get_labels_info()
             n_rows = self.get_shape()
-            all_columns = pd.Series(n_rows * ['0'], name=available_labels[0])
+            all_columns = pd.Series(np.zeros(n_rows, dtype=np.uint8), name=default_label)
         else:
             columns = [self.get_label_series(l) for l in self.labels_list]
             all_columns = pd.concat(columns, axis=1)
         return all_columns
 
-    def labels_merged_list_to_df(self):
-        columns = [self.get_label_series(l) for l in self.labels_list]
-        all_columns = self.merge_same_label_types(columns)
-        return all_columns
+    def labels_merged_list_to_df(self, new_labels):
+        return self.merge_same_label_types(new_labels)
 
     def save(self):
-        label_df = self.labels_list_to_df()
-        func_df = self.df.iloc[:, self.get_function_columns()]
-        all_data = self.df.iloc[:, self.get_original_columns()]
-
-        if func_df is not None:
-            all_data_final = pd.concat([all_data, func_df], axis=1)
-        if label_df is not None:
-            all_data_final = pd.concat([all_data, label_df], axis=1)
-
+        self.prepare_save()()
+
+    def export(self):
+        self.prepare_export()()
+
+    def prepare_save(self):
+        # Data to save is gathered now; the returned function writes it and can be called from another thread
+        if config.get_labels_only():
+            return self.prepare_labels()
+        return self.prepare_export()
+
+    def prepare_labels(self):
+        # Only the label intervals, next to where the labeled file would be: cheap whatever the file length
+        labels_path = config.get_generated_path(self.filename, config.LABELS_EXT)
+        labels = [[label[0], list(label[1])] + list(label[2:]) for label in self.labels_list]
+        data = {"rows": self.get_shape(), "labels": labels}
+
+        def write():
+            os.makedirs(labels_path.parent, exist_ok=True)
+            config.write_json(data, labels_path)
+        return write
+
+    def prepare_export(self):
+        # Labeled copy of the whole file (and of the merged labels, for anomaly detection projects). What depends
+        # on the current state is read now, the label columns are built and written by the returned function
         file_path = Path(self.filename)
         # Ensure filename is valid
         if not self.filename or not os.path.isfile(self.filename):
             raise ValueError("Invalid filename provided: {}".format(self.filename))
 
+        snapshot = copy.copy(self)
+        snapshot.df = self.df.copy(deep=False)  # later columns added or removed do not affect it
+        snapshot.labels_list = list(self.labels_list)
+        orig_col = self.get_original_columns()
+        default_label = config.get_labels_info()[0][0]
+        binary_copy = config.get_binary_copy() or config.use_memory_map(self.filename)
+        # merge labels if is an anomaly detection project
+        anomaly_detection_options = config.get_additional_options()
+        merged_labels = self.get_merged_label_names() if anomaly_detection_options[0] == 'true' else None
+
         # Keep same directory if already in tsl_generated folder
         if os.path.dirname(self.filename).endswith("tsl_generated"):
             new_dir_path = os.path.dirname(self.filename)
         else:
             # Create new directory for generated files
             new_dir_path = os.path.join(os.path.dirname(self.filename), "tsl_generated")
-        os.makedirs(new_dir_path, exist_ok=True)
         new_file_name = os.path.join(new_dir_path, file_path.name)
+        # the labels-only save is now out of date
+        labels_path = config.get_generated_path(self.filename, config.LABELS_EXT)
+
+        def write():
+            # Function columns are not written: they are computed again from the configuration when the file is
+            # opened, written ones would be read back as original columns
+            label_df = snapshot.labels_list_to_df(default_label)
+            all_data = snapshot.df.iloc[:, orig_col]
+            all_data_final = pd.concat([all_data, label_df], axis=1)
+
+            # The file may have been read from a binary copy: write it in the format of its name
+            os.makedirs(new_dir_path, exist_ok=True)
+            io = get_format(file_path.suffix)
+            io.save(all_data_final, new_file_name)
 
-        self.io.save(all_data_final, new_file_name)
+            # binary copy of the labeled file, preferred to the CSV when reopening (and mapped, if required)
+            if binary_copy:
+                binary_io = get_format(config.BINARY_COPY_EXT)
+                binary_io.save(all_data_final, str(Path(new_file_name).with_suffix(config.BINARY_COPY_EXT)))
 
-        # merge labels if is an anomaly detection project
-        anomaly_detection_options = config.get_additional_options()
-        if(anomaly_detection_options[0] == 'true'):
-            #merge columns together
-            label_df = self.labels_merged_list_to_df()
-            all_data_merged_labels = pd.concat([all_data, label_df], axis=1)
+            if merged_labels is not None:
+                #merge columns together
+                label_df = snapshot.labels_merged_list_to_df(merged_labels)
+                all_data_merged_labels = pd.concat([all_data, label_df], axis=1)
 
-            #create new directory for labeled data
-            new_dir_path = os.path.join(os.path.dirname(self.filename), "ad_labeled_files")
-            os.makedirs(new_dir_path, exist_ok=True)
-            new_file_path = self.filename.replace(os.path.dirname(self.filename), new_dir_path)
+                #create new directory for labeled data
+                ad_dir_path = os.path.join(os.path.dirname(self.filename), "ad_labeled_files")
+                os.makedirs(ad_dir_path, exist_ok=True)
+                new_file_path = self.filename.replace(os.path.dirname(self.filename), ad_dir_path)
 
-            #save labeled data
-            self.io.save(all_data_merged_labels, new_file_path)
+                #save labeled data
+                io.save(all_data_merged_labels, new_file_path)
+
+            if labels_path.exists():
+                os.remove(labels_path)
+        return write
+
+    @staticmethod
+    def convert(source, target):
+        # Converts a file once into its binary copy, which can then be memory-mapped. The file is streamed in
+        # chunks, so it does not need to fit in memory
+        io = get_format(os.path.splitext(source)[1])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            if io is None:
+                raise BadFileError
+            get_format(os.path.splitext(target)[1]).save_chunks(io.read_chunks(source), target)
+        except BadFileError:
+            config.logger.error("Cannot convert file {}, is it structured correctly?".format(source))
+            raise
+        config.logger.info("Converted {} into {}".format(source, target))
+
+    def resample(self, rate, source_rate=None):
+        # Brings the samples to rate (Hz), from the rate of the timestamps (or source_rate without them). All the
+        # columns are resampled together, the labels are moved to the samples covering the same time. Returns
+        # whether the file was changed
+        timestamp = self.get_timestamp()
+        current = get_rate(timestamp) if len(timestamp) else (float(source_rate) if source_rate else None)
+        if not current or not rate or abs(current - float(rate)) < 1e-6 * float(rate):
+            return False
+        if self.mapped or self.functions:
+            config.logger.warning("Cannot resample {}: it is mapped or has functions".format(self.filename))
+            return False
+
+        up, down = get_factors(current, rate)
+        columns = [key for key in self.df if key != TIMESTAMP]
+        values = resample_values(self.df[columns].values, up, down)
+        length = len(values)
+        start = timestamp.iloc[0] if len(timestamp) else 0
+        # added after the data if there was none, the plot settings refer to the columns by position
+        position = list(self.df).index(TIMESTAMP) if TIMESTAMP in self.df else len(columns)
+        # timestamps in any case: the resampled file, once saved, is known to be at the new rate
+        df = pd.DataFrame(values, columns=columns)
+        df.insert(position, TIMESTAMP, get_timestamps(start, rate, length))
+        self.df = df
+        self.labels_list = [[label[0], remap_range(*label[1], up, down, length)] + list(label[2:])
+                            if label[1] != (0, 0) else label for label in self.labels_list]
+        self.sampled = {}
+        self.summary = None
+        self.time = None
+        config.logger.info("Resampled {} from {:g} Hz to {:g} Hz".format(self.filename, current, float(rate)))
+        return True
+
+    def get_time(self):
+        # Index of the series to process and seconds between samples (see resampling.get_deltas), computed once
+        # for all the functions of the file
+        if self.time is None:
+            index = pd.DatetimeIndex(self.df[TIMESTAMP]) if TIMESTAMP in self.df else self.df.index
+            deltas = get_deltas(index)
+            if deltas is None and self.sample_rate:
+                deltas = 1 / float(self.sample_rate)
+            self.time = (index, deltas)
+        return self.time
+
+    def set_sample_rate(self, rate):
+        self.sample_rate = rate
+        self.time = None
 
     def get_series_to_process(self, column, name):
         data = self.df.iloc[:, column]
-        index = pd.DatetimeIndex(self.df[TIMESTAMP]) if TIMESTAMP in self.df else self.df.index
-        return pd.Series(data.values, index=index, name=name)
-
-    def add_function(self, series):
-        self.df = pd.concat([self.df, series], axis=1)
+        index, deltas = self.get_time()
+        ts = pd.Series(data.values, index=index, name=name)
+        ts.attrs["deltas"] = deltas
+        return ts
+
+    def get_data_to_process(self, columns, name):
+        # A series for a single column, a frame for several ones (see TimeFunction.process_frame)
+        if len(columns) == 1:
+            return self.get_series_to_process(columns[0], name)
+        index, deltas = self.get_time()
+        frame = pd.DataFrame({key: self.df[key].values for key in self.df.columns[columns]}, index=index)
+        frame.attrs["name"] = name
+        frame.attrs["deltas"] = deltas
+        return frame
+
+    def add_function(self, series, source=None, sample=True):
+        if isinstance(series, pd.DataFrame):
+            # several columns, listed under the name of the function. Downsampled only if plotted
+            self.function_sets[series.attrs["name"]] = list(series.columns)
+            for key in series.columns:
+                self.add_function(series[key], source, sample=False)
+            return
+
+        # Inserted in place: concatenating would copy (and, if mapped, load) all the other columns
+        self.df.insert(self.df.shape[1], series.name, series.values, allow_duplicates=True)
+        self.functions.append(series.name)
+        if series.attrs.get("markers") is not None:
+            self.markers[series.name] = (source, np.asarray(series.attrs["markers"]))
+
+        # downsampled once, not at every redraw (unless the file is not plotted)
+        sampled = downsample(self.df.iloc[:, -1], self.mapped) if sample else None
+        if sampled is not None:
+            self.sampled[self.df.shape[1] - 1] = sampled
+
+    def get_function_names(self):
+        # Functions computed on the file (columns of the same function counted once)
+        in_sets = [key for columns in self.function_sets.values() for key in columns]
+        return [key for key in self.functions if key not in in_sets] + list(self.function_sets)
+
+    def get_function_set(self, f_name):
+        # Columns of a function
+        return self.function_sets.get(f_name, [f_name])
+
+    def get_markers(self, column):
+        # Samples marked by the functions computed from a column, or by the column itself
+        marked = [indexes for name, (source, indexes) in self.markers.items() if column in (name, source)]
+        return np.unique(np.concatenate(marked)) if marked else None
 
     def remove_function(self, f_name):
-        del self.df[f_name]
+        for key in self.get_function_set(f_name):
+            if key in self.functions:
+                del self.df[key]
+                self.functions.remove(key)
+                self.markers.pop(key, None)
+        self.function_sets.pop(f_name, None)
+        # following columns are shifted
+        self.sampled = {}
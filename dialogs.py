@@ -40,6 +40,17 @@ def notify_read_error(filename):
         exit(0)
 
 
+def notify_save_error(files):
+    msg = QMessageBox()
+    msg.setIcon(QMessageBox.Warning)
+    msg.setWindowTitle("Warning")
+    msg.setText("An error occurred while saving:\n" + "\n".join(files) +
+                "\nThe changes are still unsaved.")
+    msg.setStyleSheet("QLabel { margin-right: 7px; }")
+
+    msg.exec_()
+
+
 def notify_function_error():
     msg = QMessageBox()
     msg.setIcon(QMessageBox.Warning)
@@ -49,3 +60,16 @@ def notify_function_error():
     msg.setStyleSheet("QLabel { margin-right: 7px; }")
 
     msg.exec_()
+
+
+def report_batch(total, failures):
+    msg = QMessageBox()
+    msg.setIcon(QMessageBox.Warning if failures else QMessageBox.Information)
+    msg.setWindowTitle("Information")
+    text = "The function has been applied to {} of {} files.".format(total - len(failures), total)
+    if failures:
+        text += "\nFailed:\n" + "\n".join("{}: {}".format(file, e) for file, e in sorted(failures.items()))
+    msg.setText(text)
+    msg.setStyleSheet("QLabel { margin-right: 7px; }")
+
+    msg.exec_()
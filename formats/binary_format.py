@@ -0,0 +1,192 @@
+import os
+import json
+import functools
+import shutil
+import time
+import struct
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from formats.format import Format, BadFileError, CHUNK_SIZE, atomic_file
+
+MAGIC = b'TSLB\x01'
+ALIGNMENT = 64
+
+
+# Columnar binary layout (Feather-like): a JSON header followed by one contiguous buffer per column.
+#   MAGIC | uint32 header length | header | padding | column 0 | padding | column 1 | ...
+# The header lists rows and, for each column, its name, NumPy dtype and byte offset.
+class BinaryFormat(Format):
+    extensions = ['.tslb']
+
+    @staticmethod
+    def read_header(in_file):
+        if in_file.read(len(MAGIC)) != MAGIC:
+            return None
+        size, = struct.unpack('<I', in_file.read(4))
+        return json.loads(in_file.read(size).decode('utf-8'))
+
+    def read(self, filename):
+        self.timings = {}
+        start = time.perf_counter()
+
+        try:
+            with open(filename, 'rb') as in_file:
+                header = self.read_header(in_file)
+                if header is None:
+                    return None
+                in_file.seek(0)
+                buffer = bytearray(in_file.read())
+        except (OSError, ValueError):
+            return None
+
+        rows = header["rows"]
+        columns = {}
+        for i, col in enumerate(header["columns"]):
+            columns[i] = np.frombuffer(buffer, dtype=np.dtype(col["dtype"]), count=rows, offset=col["offset"])
+        df = pd.DataFrame(columns, index=pd.RangeIndex(rows), copy=False)
+        df.columns = [col["name"] for col in header["columns"]]
+
+        self.timings["load"] = time.perf_counter() - start
+        return df
+
+    def map(self, filename):
+        # Zero-copy: every column is a copy-on-write view of the file, paged in only when accessed
+        self.timings = {}
+        start = time.perf_counter()
+
+        try:
+            with open(filename, 'rb') as in_file:
+                header = self.read_header(in_file)
+            if header is None:
+                return None
+
+            rows = header["rows"]
+            columns = {}
+            for i, col in enumerate(header["columns"]):
+                dtype = np.dtype(col["dtype"])
+                if rows == 0:
+                    columns[i] = np.empty(0, dtype=dtype)
+                else:
+                    columns[i] = np.memmap(filename, dtype=dtype, mode='c', offset=col["offset"], shape=(rows,))
+        except (OSError, ValueError):
+            return None
+
+        df = pd.DataFrame(columns, index=pd.RangeIndex(rows), copy=False)
+        df.columns = [col["name"] for col in header["columns"]]
+
+        self.timings["map"] = time.perf_counter() - start
+        return df
+
+    def read_chunks(self, filename, chunk_size=CHUNK_SIZE):
+        # Slices of the mapped file: pages are only read when a chunk is used
+        df = self.map(filename)
+        if df is None:
+            raise BadFileError
+        for start in range(0, max(df.shape[0], 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def save(self, dataframe, filename):
+        arrays = []
+        for i in range(dataframe.shape[1]):
+            column = dataframe.iloc[:, i]
+            arrays.append(np.ascontiguousarray(self.to_array(column)))
+
+        columns = [{"name": str(name), "dtype": a.dtype.str, "offset": 0} for name, a in zip(dataframe.columns, arrays)]
+        self.write(filename, dataframe.shape[0], columns, [lambda out_file, a=a: out_file.write(a.tobytes())
+                                                          for a in arrays])
+
+    def save_chunks(self, chunks, filename):
+        # Every column is first appended to its own temporary file, then the columns are copied one after the
+        # other: only one chunk is in memory at a time
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(filename) or None)
+        try:
+            rows = 0
+            columns = None
+            for chunk in chunks:
+                if columns is None:
+                    columns = [{"name": str(name), "dtype": None, "offset": 0} for name in chunk.columns]
+                for i, col in enumerate(columns):
+                    values = self.to_array(chunk.iloc[:, i])
+                    col_file = os.path.join(tmp_dir, str(i))
+                    if col["dtype"] is not None and values.dtype != np.dtype(col["dtype"]):
+                        values = self.promote(col_file, col, values)
+                    col["dtype"] = values.dtype.str
+                    with open(col_file, 'ab') as out_file:
+                        out_file.write(np.ascontiguousarray(values).tobytes())
+                rows += chunk.shape[0]
+
+            def copy(i):
+                def copy_column(out_file):
+                    with open(os.path.join(tmp_dir, str(i)), 'rb') as in_file:
+                        shutil.copyfileobj(in_file, out_file)
+                return copy_column
+            self.write(filename, rows, columns or [], [copy(i) for i in range(len(columns or []))])
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def promote(self, col_file, col, values):
+        # A column whose type changes between chunks (e.g. integers, then missing values) is converted to a
+        # type fitting both: the part already written is rewritten, a chunk at a time
+        written = np.dtype(col["dtype"])
+        rows = os.path.getsize(col_file) // written.itemsize
+
+        def read_blocks():
+            for start in range(0, rows, CHUNK_SIZE):
+                yield np.fromfile(col_file, dtype=written, count=CHUNK_SIZE, offset=start * written.itemsize)
+
+        try:
+            dtype = np.result_type(written, values.dtype)
+        except TypeError:
+            dtype = None
+        if dtype is None or dtype.kind == 'O':
+            # as text, as long as the longest value
+            values = values.astype(str)
+            dtype = functools.reduce(np.result_type, (block.astype(str).dtype for block in read_blocks()), values.dtype)
+        if dtype != written:
+            tmp_file = col_file + '.tmp'
+            with open(tmp_file, 'wb') as out_file:
+                for block in read_blocks():
+                    block.astype(dtype).tofile(out_file)
+            os.replace(tmp_file, col_file)
+        return values.astype(dtype)
+
+    def write(self, filename, rows, columns, writers):
+        # columns: name and dtype of each column, writers: functions writing each column into the open file
+        itemsizes = [np.dtype(col["dtype"]).itemsize for col in columns]
+
+        # Offsets depend on the header size, which depends on the offsets: reserve room for them first
+        header = {"rows": rows, "columns": columns}
+        offset = self.align(len(MAGIC) + 4 + len(json.dumps(header).encode('utf-8')) + 24 * len(columns))
+        for col, itemsize in zip(columns, itemsizes):
+            col["offset"] = offset
+            offset = self.align(offset + rows * itemsize)
+        encoded = json.dumps(header).encode('utf-8')
+
+        with atomic_file(filename) as tmp_name, open(tmp_name, 'wb') as out_file:
+            out_file.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+            for col, writer in zip(columns, writers):
+                out_file.write(b'\0' * (col["offset"] - out_file.tell()))
+                writer(out_file)
+
+    @staticmethod
+    def to_array(column):
+        # Labels may be stored as '0'/'1' strings: keep them numeric, as after a CSV round trip
+        try:
+            return pd.to_numeric(column).values
+        except (ValueError, TypeError):
+            pass
+        # Timestamps are stored as datetime64, so that they can be mapped too (the first value is tried alone,
+        # to avoid parsing a whole text column element by element)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                pd.to_datetime(column.iloc[:1])
+                return pd.to_datetime(column).values
+        except (ValueError, TypeError, OverflowError):
+            return column.astype(str).values.astype(str)
+
+    @staticmethod
+    def align(offset):
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
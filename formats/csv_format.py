@@ -1,6 +1,9 @@
 import csv
+import time
 import pandas as pd
-from formats.format import Format
+from formats.format import Format, BadFileError, CHUNK_SIZE, atomic_file
+
+SNIFF_SIZE = 1024
 
 
 class CSVFormat(Format):
@@ -9,23 +12,56 @@ class CSVFormat(Format):
     @staticmethod
     def get_dialect(filename):
         with open(filename) as csv_file:
-            dialect = csv.Sniffer().sniff(csv_file.read(1024))
+            dialect = csv.Sniffer().sniff(csv_file.read(SNIFF_SIZE))
         return dialect
 
     def read(self, filename):
-        try:
-            d = self.get_dialect(filename)
-            df = pd.read_csv(filename, dialect=d, sep=d.delimiter, doublequote=d.doublequote)
-
-            # Fix for columns with the same name
-            with open(filename, 'r') as f:
-                reader = csv.reader(f, dialect=d)
-                header = next(reader)
-            df.columns = header
-        except pd.errors.ParserError:
-            df = None
+        # Single pass: dialect, header and data are all taken from the same open handle
+        self.timings = {}
+        start = time.perf_counter()
+
+        with open(filename, newline='') as csv_file:
+            d = csv.Sniffer().sniff(csv_file.read(SNIFF_SIZE))
+            csv_file.seek(0)
+            self.timings["sniff"] = time.perf_counter() - start
+
+            # Header is parsed by hand to keep columns with the same name
+            header = next(csv.reader(csv_file, dialect=d), None)
+            self.timings["header"] = time.perf_counter() - start - self.timings["sniff"]
+            if header is None:
+                return None
 
+            try:
+                df = pd.read_csv(csv_file, header=None, dialect=d, sep=d.delimiter, doublequote=d.doublequote)
+                df.columns = header
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=header)
+            except (pd.errors.ParserError, ValueError):
+                df = None
+
+        self.timings["parse"] = time.perf_counter() - start - self.timings["sniff"] - self.timings["header"]
         return df
 
+    def read_chunks(self, filename, chunk_size=CHUNK_SIZE):
+        # Same parsing as read, but only chunk_size rows are held at a time
+        with open(filename, newline='') as csv_file:
+            d = csv.Sniffer().sniff(csv_file.read(SNIFF_SIZE))
+            csv_file.seek(0)
+            header = next(csv.reader(csv_file, dialect=d), None)
+            if header is None:
+                raise BadFileError
+
+            try:
+                reader = pd.read_csv(csv_file, header=None, dialect=d, sep=d.delimiter, doublequote=d.doublequote,
+                                     chunksize=chunk_size)
+                for chunk in reader:
+                    chunk.columns = header
+                    yield chunk
+            except pd.errors.EmptyDataError:
+                yield pd.DataFrame(columns=header)
+            except (pd.errors.ParserError, ValueError):
+                raise BadFileError
+
     def save(self, dataframe, filename):
-        dataframe.to_csv(filename, sep=',', index=False)
+        with atomic_file(filename) as tmp_name:
+            dataframe.to_csv(tmp_name, sep=',', index=False)
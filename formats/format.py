@@ -1,8 +1,14 @@
+import os
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import pandas as pd
+
+CHUNK_SIZE = 2**18  # rows per chunk when streaming a file
 
 
 class Format(ABC):
     extensions = None
+    timings = None  # seconds spent in each stage of the last read, if measured
 
     @abstractmethod
     def read(self, filename):
@@ -12,6 +18,23 @@ class Format(ABC):
     def save(self, dataframe, filename):
         pass
 
+    def map(self, filename):
+        # Formats that cannot be memory-mapped are simply read
+        return self.read(filename)
+
+    def read_chunks(self, filename, chunk_size=CHUNK_SIZE):
+        # Consecutive DataFrames of at most chunk_size rows. Formats that cannot be streamed are read whole
+        # and sliced, so only those that can keep the memory bounded by the chunk size
+        df = self.read(filename)
+        if df is None:
+            raise BadFileError
+        for start in range(0, max(df.shape[0], 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def save_chunks(self, chunks, filename):
+        # Writes the chunks as a single file, all at once unless the format can append them
+        self.save(pd.concat(list(chunks)), filename)
+
 
 def get_format(ext):
     for cls in Format.__subclasses__():
@@ -28,6 +51,20 @@ def get_all_formats():
     return format_list
 
 
+@contextmanager
+def atomic_file(filename):
+    # Name to write filename under: the file is only replaced once complete, so it is never left half
+    # written (and a memory-mapped previous version stays valid)
+    tmp_name = os.path.join(os.path.dirname(str(filename)), '.' + os.path.basename(str(filename)) + '.tmp')
+    try:
+        yield tmp_name
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    os.replace(tmp_name, filename)
+
+
 # Exceptions
 class UnrecognizedFormatError(Exception):
     pass
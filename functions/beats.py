@@ -0,0 +1,109 @@
+from functions.time_function import TimeFunction
+from functions.filters import get_sample_rate, RATE_PARAMETER
+from summary import get_runs
+from scipy import signal
+import pandas as pd
+import numpy as np
+
+POLARITY_NAMES = ['Peaks', 'Valleys']
+BAND = [0.5, 8.0]  # Hz, band of the pulse wave
+
+
+class BeatDetection(TimeFunction):
+    def get_name(self):
+        return 'Heart rate'
+
+    def get_parameters(self):
+        return {
+            "Systolic": {
+                "type": "combo",
+                "values": POLARITY_NAMES,
+                "default": 0
+            },
+            "Peak window (ms)": {
+                "type": "int",
+                "min": 10,
+                "max": 1000,
+                "default": 111
+            },
+            "Beat window (ms)": {
+                "type": "int",
+                "min": 100,
+                "max": 5000,
+                "default": 667
+            },
+            "Threshold offset": {
+                "type": "double",
+                "default": 0.02
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def process_series(self, ts, param):
+        # Heart rate (beats per minute) from each beat to the next one. The beats are returned as the markers
+        # of the series, sample indexes to be drawn on the plots
+        try:
+            rate = get_sample_rate(ts, param.get(RATE_PARAMETER))
+            offset = float(param["Threshold offset"])
+        except ValueError:
+            return None
+        if not rate or rate / 2 <= BAND[1] or len(ts) < 2:
+            return None
+
+        values = ts.values.astype(float)
+        if param.get("Systolic", POLARITY_NAMES[0]) == 'Valleys':
+            values = -values
+        peak_window = max(int(round(param["Peak window (ms)"] * rate / 1000)), 1)
+        beat_window = max(int(round(param["Beat window (ms)"] * rate / 1000)), 1)
+        peaks = self.detect_peaks(values, rate, peak_window, beat_window, offset)
+
+        hr = np.full(len(values), np.nan)
+        if len(peaks) > 1:
+            # held from a beat to the next one
+            bpm = 60 * rate / np.diff(peaks)
+            hr[peaks[1]:] = np.repeat(bpm, np.diff(np.append(peaks[1:], len(values))))
+
+        fs = pd.Series(hr, name=ts.name)
+        fs.attrs["markers"] = peaks
+        return fs
+
+    @staticmethod
+    def detect_peaks(values, rate, peak_window, beat_window, offset):
+        # Two moving averages of the squared pulse wave (Elgendi et al., 2013): blocks where the one over a
+        # systolic peak exceeds the one over a beat (plus an offset) contain a peak, taken at their maximum.
+        # Linear in the length of the series
+        sos = signal.butter(2, BAND, btype='bandpass', fs=rate, output='sos')
+        filtered = signal.sosfiltfilt(sos, values - values.mean()) if len(values) > 15 else values - values.mean()
+        squared = np.square(np.clip(filtered, 0, None))
+
+        ma_peak = centered_average(squared, peak_window)
+        ma_beat = centered_average(squared, beat_window)
+        starts, ends = get_runs(ma_peak > ma_beat + offset * squared.mean())
+        wide = ends - starts + 1 >= peak_window
+        starts, ends = starts[wide], ends[wide]
+        if not len(starts):
+            return np.array([], dtype=np.int64)
+
+        # maximum of each block, the first one if repeated
+        bounds = np.column_stack((starts, ends + 1)).ravel()
+        block_max = np.maximum.reduceat(np.append(filtered, -np.inf), bounds)[::2]
+        is_start = np.zeros(len(values), dtype=np.int64)
+        is_start[starts] = 1
+        block = np.cumsum(is_start) - 1  # last block started at each sample
+        position = np.arange(len(values))
+        inside = (block >= 0) & (position <= ends[np.clip(block, 0, None)])
+        candidates = np.flatnonzero(inside & (filtered == block_max[np.clip(block, 0, None)]))
+        _, first = np.unique(block[candidates], return_index=True)
+        return candidates[first].astype(np.int64)
+
+
+def centered_average(values, size):
+    # Average of the size samples around each one, fewer at the edges
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    half = size // 2
+    a = np.clip(np.arange(len(values)) - half, 0, len(values))
+    b = np.clip(np.arange(len(values)) - half + size, 0, len(values))
+    return (sums[b] - sums[a]) / (b - a)
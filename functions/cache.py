@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+MEMORY_BUDGET = 256 * 2**20  # bytes of results kept in memory
+STORE_BUDGET = 2 * 2**30  # bytes of results kept on disk, if enabled
+STORE_EXT = '.npy'
+HASH_CHUNK = 2**20  # samples hashed at a time, so that long (or memory-mapped) columns are not copied at once
+STORE_PATH = os.path.expanduser('~/.config/tsl/functions')
+
+
+# Results of the functions, addressed by their content: the same function with the same parameters applied to
+# the same data (whatever the file or the column it comes from) is only computed once. Recent results are kept
+# in memory, and in a folder so that they survive the session (new ones only if enabled, or by a batch run).
+class ResultCache:
+    def __init__(self, budget=MEMORY_BUDGET, store=None, persist=True):
+        self.budget = budget
+        self.store = store  # folder of the on-disk results, None if disabled
+        self.persist = persist  # new results are added to the store, otherwise it is only read
+        self.entries = OrderedDict()  # key -> values
+        self.size = 0
+        self.stored_size = None  # bytes in the store, counted on the first save
+
+    @staticmethod
+    def get_key(function, ts, param):
+        # Hash of the samples (of each column, for a frame) and of their timestamps, plus what the function does
+        # with them
+        digest = hashlib.blake2b(digest_size=20)
+        columns = [ts[key].values for key in ts.columns] if isinstance(ts, pd.DataFrame) else [ts.values]
+        for values in columns + [ts.index]:
+            if isinstance(values, pd.RangeIndex):
+                digest.update(str((values.start, values.stop, values.step)).encode('utf-8'))
+            elif np.asarray(values).dtype.kind in 'biufcmM':
+                values = np.asarray(values)
+                digest.update(values.dtype.str.encode('utf-8'))
+                if values.dtype.kind in 'mM':
+                    values = values.view(np.int64)  # no buffer of datetimes
+                for i in range(0, len(values), HASH_CHUNK):
+                    digest.update(memoryview(np.ascontiguousarray(values[i:i + HASH_CHUNK])))
+            else:
+                digest.update(pd.util.hash_pandas_object(pd.Series(values), index=False).values.tobytes())
+        # a sample rate may be given to files without timestamps (see DataFile.get_time)
+        deltas = ts.attrs.get("deltas")
+        if deltas is not None and np.isscalar(deltas) and isinstance(ts.index, pd.RangeIndex):
+            digest.update(repr(float(deltas)).encode('utf-8'))
+        digest.update(json.dumps([function, param], sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        values = self.entries.get(key)
+        if values is not None:
+            self.entries.move_to_end(key)
+            return values
+
+        values = self.load(key)
+        if values is not None:
+            self.put(key, values, stored=True)
+        return values
+
+    def put(self, key, values, stored=False):
+        if key in self.entries:
+            self.size -= self.entries.pop(key).nbytes
+        self.entries[key] = values
+        self.size += values.nbytes
+        while self.size > self.budget and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+        if self.store is not None and self.persist and not stored:
+            self.save(key, values)
+
+    def load(self, key):
+        if self.store is None:
+            return None
+        path = os.path.join(self.store, key + STORE_EXT)
+        try:
+            values = np.load(path, allow_pickle=False)
+            os.utime(path)  # least recently used results are removed first
+            return values
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, values):
+        if values.dtype == object:
+            return  # not storable without pickling
+        try:
+            os.makedirs(self.store, exist_ok=True)
+            # several processes may write the same result at once (see batch)
+            tmp_path = os.path.join(self.store, '{}.{}.tmp'.format(key, os.getpid()))
+            with open(tmp_path, 'wb') as out_file:
+                np.save(out_file, values, allow_pickle=False)
+            path = os.path.join(self.store, key + STORE_EXT)
+            os.replace(tmp_path, path)
+            if self.stored_size is None:
+                self.stored_size = self.get_stored_size()
+            else:
+                self.stored_size += os.path.getsize(path)
+            if self.stored_size > STORE_BUDGET:
+                self.prune()
+        except OSError:
+            pass  # the store is only an optimisation
+
+    def get_stored_size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.store) if entry.name.endswith(STORE_EXT))
+
+    def prune(self):
+        # Least recently used results first, until the store is within its budget. The total is counted again,
+        # as other processes may share the store
+        files = [entry for entry in os.scandir(self.store) if entry.name.endswith(STORE_EXT)]
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= STORE_BUDGET:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+        self.stored_size = total
+
+    def set_store(self, store, persist=True):
+        if store != self.store:
+            self.stored_size = None
+        self.store = store
+        self.persist = persist
@@ -0,0 +1,109 @@
+from functions.time_function import TimeFunction
+from functions.quality import reduce_windows, MAX_WINDOW
+import pandas as pd
+import numpy as np
+
+OUTPUT_NAMES = ['Ratio', 'SpO2']
+SCALING_NAMES = ['None', 'Z-score']
+
+
+# Functions of several channels: the sources come as the columns of a frame, evaluated together on its values
+# (samples x sources)
+class ChannelFunction:
+    def process_series(self, ts, param):
+        # not defined on a single channel
+        return None
+
+    def process_frame(self, frame, param):
+        values = self.process_values(frame.values.astype(float), param)
+        return None if values is None else pd.Series(values, name=frame.attrs.get("name"))
+
+
+class RatioOfRatios(ChannelFunction, TimeFunction):
+    def get_name(self):
+        return 'Ratio of ratios'
+
+    def get_sources(self):
+        return ["Red", "IR"]
+
+    def get_parameters(self):
+        return {
+            "Output": {
+                "type": "combo",
+                "values": OUTPUT_NAMES,
+                "default": 0
+            },
+            "Window size": {
+                "type": "int",
+                "min": 2,
+                "max": MAX_WINDOW,
+                "default": 400
+            }
+        }
+
+    def process_values(self, values, param):
+        # (AC / DC) of red over (AC / DC) of infrared, on windows: AC as the peak to peak amplitude
+        def reduce(windows):
+            perfusion = (windows.max(axis=-1) - windows.min(axis=-1)) / np.abs(windows.mean(axis=-1))
+            return perfusion[:, 0] / perfusion[:, 1]
+
+        ratio = reduce_windows(values, int(param["Window size"]), reduce)
+        if ratio is None:
+            return None
+        ratio[~np.isfinite(ratio)] = np.nan
+        # usual linear calibration, to be adjusted for each sensor
+        return 110 - 25 * ratio if param.get("Output") == 'SpO2' else ratio
+
+
+class ChannelDifference(ChannelFunction, TimeFunction):
+    def get_name(self):
+        return 'Channel difference'
+
+    def get_sources(self):
+        return ["Channel", "Subtracted channel"]
+
+    def get_parameters(self):
+        return {
+            "Scaling": {
+                "type": "combo",
+                "values": SCALING_NAMES,
+                "default": 1
+            }
+        }
+
+    def process_values(self, values, param):
+        if param.get("Scaling") == 'Z-score':
+            # channels of different intensity, made comparable
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+        return values[:, 0] - values[:, 1]
+
+
+class ChannelCorrelation(ChannelFunction, TimeFunction):
+    def get_name(self):
+        return 'Channel correlation'
+
+    def get_sources(self):
+        return ["Channel", "Other channel"]
+
+    def get_parameters(self):
+        return {
+            "Window size": {
+                "type": "int",
+                "min": 2,
+                "max": MAX_WINDOW,
+                "default": 400
+            }
+        }
+
+    def process_values(self, values, param):
+        # Pearson correlation on windows
+        def reduce(windows):
+            centred = windows - windows.mean(axis=-1, keepdims=True)
+            covariance = np.mean(centred[:, 0] * centred[:, 1], axis=-1)
+            return covariance / (centred[:, 0].std(axis=-1) * centred[:, 1].std(axis=-1))
+
+        correlation = reduce_windows(values, int(param["Window size"]), reduce)
+        if correlation is not None:
+            correlation[~np.isfinite(correlation)] = np.nan
+        return correlation
@@ -1,20 +1,26 @@
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
+from PyQt5.QtCore import Qt, QThread, QEventLoop, pyqtSignal
 from settings import LabelTable, LabelDialog, pltc
 from functions.time_function import TimeFunction
+from functions import pipeline
+import batch
 import config
 import dialogs
 
+ALL_CHANNELS = "All channels"
+
 
 # noinspection PyArgumentList
 class FunctionDialog(QDialog):
-    def __init__(self, title="Function setup", parameters=None):
+    def __init__(self, title="Function setup", parameters=None, channels=False, sources=None):
         super().__init__()
         self.setWindowTitle(title)
         ts_list = config.get_datafile().get_data_header()
 
         self.name = None
         self.source = None
+        self.sources = []  # one column for each source of the function
         self.parameters = dict()
 
         main_layout = QVBoxLayout()
@@ -25,12 +31,20 @@ class FunctionDialog(QDialog):
         self.name_input = QLineEdit()
         self.name_input.setMaxLength(20)
         self.name_input.textChanged.connect(self.validate_form)
-        self.source_input = QComboBox()
-        self.source_input.addItems(ts_list)
+        self.source_inputs = []
+        for i, source in enumerate(sources or ["Source"]):
+            source_input = QComboBox()
+            source_input.addItems(ts_list)
+            source_input.setCurrentIndex(min(i, len(ts_list) - 1))
+            self.source_inputs.append((source, source_input))
+        if channels and len(self.source_inputs) == 1:
+            # the function can be computed on all the channels at once
+            self.source_inputs[0][1].addItem(ALL_CHANNELS)
 
         layout = QFormLayout()
         layout.addRow(QLabel("Name"), self.name_input)
-        layout.addRow(QLabel("Source"), self.source_input)
+        for source, source_input in self.source_inputs:
+            layout.addRow(QLabel(source), source_input)
         self.details_box = QGroupBox("Function details")
         self.details_box.setLayout(layout)
         main_layout.addWidget(self.details_box)
@@ -58,7 +72,7 @@ class FunctionDialog(QDialog):
                     widget.setValue(param["default"])
                     self.ret_func[key] = widget.value
                 elif param["type"] == "double":  # TODO: replace with QDoubleSpinBox
-                    widget = QLineEdit()
+                    widget = QLineEdit(str(param.get("default", "")))
                     widget.setValidator(QDoubleValidator())
                     self.ret_func[key] = widget.text
 
@@ -89,34 +103,180 @@ class FunctionDialog(QDialog):
         col_list = config.get_datafile().get_data_columns()
 
         self.name = self.name_input.text()
-        self.source = col_list[self.source_input.currentIndex()]
+        for _, source_input in self.source_inputs:
+            index = source_input.currentIndex()
+            self.sources.append(col_list[index] if index < len(col_list) else None)
+        self.source = self.sources[0]
         for key in self.ret_func.keys():
             self.parameters[key] = self.ret_func[key]()
         self.close()
 
 
+# Computes a function out of the interface thread. progress(done, total) is emitted as the samples are processed,
+# for functions processing them in chunks (see pipeline.compute); cancel() stops them at the next chunk, the others
+# are only discarded once finished
+class FunctionWorker(QThread):
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, function, data, param):
+        super().__init__()
+        self.function = function
+        self.data = data
+        self.param = param
+        self.computed = None
+        self.cancelled = False
+
+    def run(self):
+        try:
+            if len(self.data) > 1:
+                self.computed = pipeline.compute_channels(self.function, self.data, self.param)
+            else:
+                self.computed = [pipeline.compute(self.function, self.data[0], self.param, self.report)]
+        except Exception:
+            config.logger.exception("Function {} failed".format(self.function.get_name()))
+            self.computed = [None]
+
+    def report(self, done, total):
+        self.progress.emit(done, total)
+        return not self.cancelled
+
+    def cancel(self):
+        self.cancelled = True
+
+
 class FunctionController:
     @staticmethod
     def add(func_index):
         function = TimeFunction.__subclasses__()[func_index]()
 
-        dialog = FunctionDialog(function.get_name(), function.get_parameters())
+        dialog = FunctionDialog(function.get_name(), function.get_parameters(), hasattr(function, 'process_channels'),
+                                function.get_sources())
         dialog.exec()
 
         if dialog.name is None:
-            return False
+            return []
 
         data_conf = config.data_config
-        ts = data_conf.datafile.get_series_to_process(dialog.source, dialog.name)
-        fs = function.process_series(ts, dialog.parameters)
+        datafile = data_conf.datafile
+        if len(dialog.sources) > 1:
+            # several sources, evaluated together
+            sources = [dialog.sources]
+            names = [dialog.name]
+        elif dialog.source is not None:
+            sources = [[dialog.source]]
+            names = [dialog.name]
+        else:
+            # one column for each channel, computed in a single pass
+            sources = [[c] for c in datafile.get_data_columns() if c in datafile.get_original_columns()]
+            names = ["{}_{}".format(dialog.name, datafile.df.columns[c[0]]) for c in sources]
 
-        if fs is None:
+        data = [datafile.get_data_to_process(columns, name) for columns, name in zip(sources, names)]
+        worker = FunctionWorker(function, data, dialog.parameters)
+        FunctionController.run_worker(worker, "Computing " + dialog.name)
+        if worker.cancelled:
+            return []
+        if any(fs is None for fs in worker.computed):
             dialogs.notify_function_error()
+            return []
+        if config.data_config is not data_conf or data_conf.datafile is not datafile:
+            # computed from a file which is no longer the current one
+            config.logger.warning("Function {} discarded, the file changed".format(dialog.name))
+            return []
+
+        for columns, name, fs in zip(sources, names, worker.computed):
+            # Stored in the configuration, to compute it again for the other files
+            spec = pipeline.make_spec(function.get_name(), name, [datafile.df.columns[c] for c in columns],
+                                      dialog.parameters)
+            data_conf.add_function(fs, spec)
+        # names of the new columns, to draw them if plotted
+        return [key for name in names for key in datafile.get_function_set(name)]
+
+    @staticmethod
+    def run_worker(worker, title):
+        # Runs the worker while the interface stays responsive, showing its progress (busy until the first report).
+        # The dialog is modal from the start: no other file nor function until the worker is done
+        progress_dialog = QProgressDialog("Starting...", "Cancel", 0, 0)
+        progress_dialog.setWindowTitle(title)
+        progress_dialog.setWindowModality(Qt.ApplicationModal)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.show()
+
+        def progress(done, total):
+            if not worker.cancelled:
+                progress_dialog.setMaximum(total)
+                progress_dialog.setValue(done)
+                progress_dialog.setLabelText("{} of {} samples".format(done, total))
+
+        def cancel():
+            worker.cancel()
+            progress_dialog.setLabelText("Cancelling...")
+
+        loop = QEventLoop()
+        worker.progress.connect(progress)
+        worker.finished.connect(loop.quit)
+        progress_dialog.canceled.connect(cancel)
+        worker.start()
+        if not worker.isFinished():
+            loop.exec_()
+        worker.wait()
+        progress_dialog.canceled.disconnect(cancel)  # also emitted when closing
+        progress_dialog.close()
+
+    @staticmethod
+    def apply_to_project(func_index):
+        # Same function on all the files of the project, in other processes (see batch)
+        function = TimeFunction.__subclasses__()[func_index]()
+
+        dialog = FunctionDialog(function.get_name() + " (all files)", function.get_parameters(),
+                                sources=function.get_sources())
+        dialog.exec()
+
+        if dialog.name is None:
             return False
 
-        data_conf.add_function(fs)
+        columns = config.get_datafile().df.columns
+        spec = pipeline.make_spec(function.get_name(), dialog.name, [columns[c] for c in dialog.sources],
+                                  dialog.parameters)
+        folder, project = config.get_project()
+        config.wait_saves()  # workers read the files as saved
+
+        progress_dialog = QProgressDialog("Starting...", "Cancel", 0, len(project["files"]))
+        progress_dialog.setWindowTitle("Applying " + dialog.name)
+        progress_dialog.setWindowModality(Qt.ApplicationModal)
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.setValue(0)
+        QApplication.processEvents()
+
+        def progress(done, total, file, result):
+            progress_dialog.setValue(done)
+            progress_dialog.setLabelText("{} ({}/{})".format(file, done, total))
+            QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        results = batch.run(folder, project, spec, progress=progress)
+        progress_dialog.close()
+
+        config.add_project_function(spec, batch.get_headers(results))
+        config.save_data_config()
+        dialogs.report_batch(len(project["files"]), batch.get_failures(results))
         return True
 
+    @staticmethod
+    def apply_pipeline():
+        # Adds to the current file the functions of its configuration it does not have yet. Results stay in the
+        # file, also while it is cached
+        datafile = config.get_datafile()
+
+        # functions removed from the configuration while the file was cached
+        names = config.get_functions()
+        for name in datafile.get_function_names():
+            if name not in names:
+                datafile.remove_function(name)
+
+        pipeline.apply_functions(datafile, config.get_function_specs())
+
     @staticmethod
     def remove(rem_index):
         # Here we could ask for confirmation
@@ -1,9 +1,14 @@
-from functions.time_function import TimeFunction
+from functions.time_function import TimeFunction, get_time_deltas
+from functions.filters import RATE_PARAMETER
+from scipy import signal
 import pandas as pd
 import numpy as np
 
 SCALE_NAMES = ['Milliseconds', 'Seconds', 'Minutes', 'Hours', 'Days']
 SCALE_VALUES = [0.001, 1.0, 60.0, 3600.0, 86400.0]
+METHOD_NAMES = ['Difference', 'Central difference', 'Savitzky-Golay']
+MAX_WINDOW = 10001  # samples
+MAX_ORDER = 6
 
 
 class Derivative(TimeFunction):
@@ -16,21 +21,150 @@ class Derivative(TimeFunction):
                 "type": "combo",
                 "values": SCALE_NAMES,
                 "default": 2
+            },
+            "Method": {
+                "type": "combo",
+                "values": METHOD_NAMES,
+                "default": 0
+            },
+            "Window size": {
+                "type": "int",
+                "min": 3,
+                "max": MAX_WINDOW,
+                "default": 7
+            },
+            "Order": {
+                "type": "int",
+                "min": 1,
+                "max": MAX_ORDER,
+                "default": 2
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
             }
         }
 
     def process_series(self, ts, param):
-        scale_index = SCALE_NAMES.index(param["Time scale"])
-        scale = SCALE_VALUES[scale_index]
-        dt = self.get_delta(ts.index, scale)
-        derivative = ts.diff() / dt
-        return pd.Series(derivative.values, name=ts.name)
+        # Per unit of the time scale. Without timestamps, per sample unless the sample rate is given
+        scale = SCALE_VALUES[SCALE_NAMES.index(param["Time scale"])]
+        method = param.get("Method", METHOD_NAMES[0])
+        values = ts.values.astype(float)
+        try:
+            dt = self.get_delta(ts, scale, param.get(RATE_PARAMETER))
+        except ValueError:
+            return None
 
-    @staticmethod
-    def get_delta(timestamp, scale):
+        if method == 'Central difference':
+            derivative = self.central_difference(values, dt)
+        elif method == 'Savitzky-Golay':
+            derivative = self.savitzky_golay(values, dt, int(param.get("Window size", 7)), int(param.get("Order", 2)))
+        else:
+            derivative = np.full(len(values), np.nan)
+            if len(values) > 1:
+                derivative[1:] = np.diff(values) / (dt if np.isscalar(dt) else dt[1:])
+        return None if derivative is None else pd.Series(derivative, name=ts.name)
+
+    # Chunk by chunk (see TimeFunction.init_state), except Savitzky-Golay (its window has fitted edges): the last
+    # samples are carried to the next chunk, the central difference of the last one waits for the following sample
+    def init_state(self, param, length=None):
+        method = param.get("Method", METHOD_NAMES[0])
+        if method == 'Savitzky-Golay':
+            return None
+        return {"scale": SCALE_VALUES[SCALE_NAMES.index(param["Time scale"])], "rate": param.get(RATE_PARAMETER),
+                "central": method == 'Central difference', "values": np.empty(0), "deltas": np.empty(0),
+                "index": None}
+
+    def process_chunk(self, state, chunk):
         try:
-            t = timestamp.to_series()
-            return t.diff().dt.total_seconds() / scale
-        except (TypeError, AttributeError):
-            return pd.Series(np.ones(len(timestamp)))
+            deltas = self.get_chunk_delta(state, chunk)
+        except ValueError:
+            return None
+        length = len(chunk)
+        values = np.concatenate((state["values"], chunk.values.astype(float)))
+        deltas = np.concatenate((state["deltas"], deltas))
+        carried = len(state["values"])
+        state["values"], state["deltas"] = values[-2:], deltas[-2:]
+
+        if not state["central"]:
+            # from the last sample of the previous chunk, if any
+            if carried:
+                return np.diff(values[-length - 1:]) / deltas[len(deltas) - length:]
+            return np.concatenate(([np.nan], np.diff(values) / deltas[1:]))[:length]
+
+        # every sample with a following one, but the first of the series: from the previous sample (and the last
+        # one of the previous chunk, carried as well, is only completed now)
+        k = np.arange(max(carried - 1, 0), len(values) - 1)
+        derivative = np.empty(len(k))
+        first = k == 0
+        derivative[first] = (values[1] - values[0]) / deltas[1] if first.any() else 0
+        k = k[~first]
+        derivative[~first] = self.uneven_difference(values[k - 1], values[k], values[k + 1], deltas[k], deltas[k + 1])
+        return derivative
+
+    def finish(self, state):
+        # Central difference of the last sample, from the previous one
+        if not state["central"] or not len(state["values"]):
+            return None
+        if len(state["values"]) < 2:
+            return np.array([np.nan])
+        return np.array([(state["values"][-1] - state["values"][-2]) / state["deltas"][-1]])
 
+    def get_chunk_delta(self, state, chunk):
+        # Step before each sample of the chunk, NaN before the first one of the series
+        ts = chunk
+        if "deltas" not in chunk.attrs and state["index"] is not None and isinstance(chunk.index, pd.DatetimeIndex):
+            # not given with the chunk: from its timestamps, after the last one of the previous chunk
+            ts = pd.Series(np.empty(len(chunk) + 1), index=pd.DatetimeIndex([state["index"]]).append(chunk.index))
+        step = self.get_delta(ts, state["scale"], state["rate"])
+        deltas = np.full(len(ts), step) if np.isscalar(step) else np.array(step, dtype=float)
+        deltas = deltas[len(ts) - len(chunk):]
+        if len(deltas) and state["index"] is None:
+            deltas[0] = np.nan
+        if len(chunk):
+            state["index"] = chunk.index[-1]
+        return deltas
+
+    @staticmethod
+    def get_delta(ts, scale, rate=None):
+        # Step before each sample in units of the scale: a single value for uniform sampling (the fast path)
+        deltas = get_time_deltas(ts)
+        if deltas is None:
+            if rate in (None, ''):
+                return 1.0
+            if float(rate) <= 0:
+                raise ValueError
+            return 1 / float(rate) / scale
+        return deltas / scale
+
+    @staticmethod
+    def central_difference(values, dt):
+        # (x[n + 1] - x[n - 1]) / (t[n + 1] - t[n - 1]) for uniform sampling, np.gradient (its second order
+        # difference, see uneven_difference) for irregular timestamps: one-sided at the edges
+        if len(values) < 2:
+            return np.full(len(values), np.nan)
+        if np.isscalar(dt):
+            derivative = np.convolve(values, [0.5 / dt, 0, -0.5 / dt], mode='same')
+            derivative[0] = (values[1] - values[0]) / dt
+            derivative[-1] = (values[-1] - values[-2]) / dt
+            return derivative
+        return np.gradient(values, np.concatenate(([0], np.cumsum(dt[1:]))))
+
+    @staticmethod
+    def uneven_difference(before, values, after, step_before, step_after):
+        # Central difference with steps of different lengths around the samples, as computed by np.gradient
+        return (after * step_before ** 2 + values * (step_after ** 2 - step_before ** 2) - before * step_after ** 2) / (
+            step_before * step_after * (step_before + step_after))
+
+    @staticmethod
+    def savitzky_golay(values, dt, size, order):
+        # Derivative of the polynomial fitted on the window around each sample, as a single convolution. The
+        # sampling is taken as uniform, at its median step
+        size += 1 - size % 2  # odd, centred
+        if size > len(values) or not 1 <= order < size:
+            return None
+        if not np.isscalar(dt):
+            dt = np.nanmedian(dt) if len(dt) > 1 else np.nan
+            if not dt > 0:
+                return None
+        return signal.savgol_filter(values, size, order, deriv=1, delta=dt, mode='interp')
@@ -0,0 +1,144 @@
+from functions.time_function import TimeFunction, get_time_deltas
+from scipy import signal
+import pandas as pd
+import numpy as np
+
+MAX_ORDER = 8
+RATE_PARAMETER = "Sample rate (Hz)"
+
+
+# Filters as second-order sections, causal: applied to the whole series at once, or chunk after chunk carrying
+# the state of the sections, the result is the same
+class SosFilter:
+    def get_sections(self, param, rate):
+        pass
+
+    def process_series(self, ts, param):
+        # The whole series is a single chunk
+        return self.process_chunk(self.init_state(param), ts)
+
+    def init_state(self, param, length=None):
+        return {"param": param, "sos": None, "zi": None}
+
+    def process_chunk(self, state, chunk):
+        values = chunk.values.astype(float)
+        if state["sos"] is None:
+            # Designed on the first chunk, which gives the sample rate if not set
+            try:
+                rate = get_sample_rate(chunk, state["param"].get(RATE_PARAMETER))
+                state["sos"] = self.get_sections(state["param"], rate) if rate else None
+            except ValueError:
+                return None
+            if state["sos"] is None or not len(values):
+                return None
+            # Steady state for the first sample, instead of a transient from zero
+            state["zi"] = signal.sosfilt_zi(state["sos"]) * values[0]
+
+        filtered, state["zi"] = signal.sosfilt(state["sos"], values, zi=state["zi"])
+        return pd.Series(filtered, name=chunk.name)
+
+
+class BandPass(SosFilter, TimeFunction):
+    def get_name(self):
+        return 'Band-pass filter'
+
+    def get_parameters(self):
+        return {
+            "Low cutoff (Hz)": {
+                "type": "double",
+                "default": 0.5
+            },
+            "High cutoff (Hz)": {
+                "type": "double",
+                "default": 8.0
+            },
+            "Order": {
+                "type": "int",
+                "min": 1,
+                "max": MAX_ORDER,
+                "default": 2
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def get_sections(self, param, rate):
+        low = float(param["Low cutoff (Hz)"])
+        high = float(param["High cutoff (Hz)"])
+        if not 0 < low < high < rate / 2:
+            return None
+        return signal.butter(int(param["Order"]), [low, high], btype='bandpass', fs=rate, output='sos')
+
+
+class HighPass(SosFilter, TimeFunction):
+    def get_name(self):
+        return 'High-pass filter'
+
+    def get_parameters(self):
+        return {
+            "Cutoff (Hz)": {
+                "type": "double",
+                "default": 0.5
+            },
+            "Order": {
+                "type": "int",
+                "min": 1,
+                "max": MAX_ORDER,
+                "default": 2
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def get_sections(self, param, rate):
+        # Removes the baseline wander
+        cutoff = float(param["Cutoff (Hz)"])
+        if not 0 < cutoff < rate / 2:
+            return None
+        return signal.butter(int(param["Order"]), cutoff, btype='highpass', fs=rate, output='sos')
+
+
+class Notch(SosFilter, TimeFunction):
+    def get_name(self):
+        return 'Notch filter'
+
+    def get_parameters(self):
+        return {
+            "Frequency (Hz)": {
+                "type": "double",
+                "default": 50.0
+            },
+            "Quality factor": {
+                "type": "double",
+                "default": 30.0
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def get_sections(self, param, rate):
+        frequency = float(param["Frequency (Hz)"])
+        quality = float(param["Quality factor"])
+        if not 0 < frequency < rate / 2 or quality <= 0:
+            return None
+        b, a = signal.iirnotch(frequency, quality, fs=rate)
+        return signal.tf2sos(b, a)
+
+
+def get_sample_rate(ts, rate=None):
+    # Given rate if any, otherwise from the time between samples (see get_time_deltas): their median step for
+    # irregular timestamps. None without timestamps, unless the files have a rate (project option)
+    if rate not in (None, ''):
+        rate = float(rate)
+        return rate if rate > 0 else None
+    deltas = get_time_deltas(ts)
+    if deltas is None or (not np.isscalar(deltas) and len(deltas) < 2):
+        return None
+    step = deltas if np.isscalar(deltas) else np.nanmedian(deltas)
+    return 1 / step if step > 0 else None
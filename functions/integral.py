@@ -1,4 +1,5 @@
-from functions.time_function import TimeFunction
+from functions.time_function import TimeFunction, get_time_deltas
+from resampling import get_deltas
 import pandas as pd
 import numpy as np
 
@@ -20,18 +21,50 @@ class Integral(TimeFunction):
         }
 
     def process_series(self, ts, param):
+        # The whole series is a single chunk
+        return self.process_chunk(self.init_state(param), ts)
+
+    # Streaming variant: chunks of a series (e.g. of a file read in chunks, or live data) are processed one after
+    # the other, the state carrying the last sample and the running total between them
+    def init_state(self, param, length=None):
         scale_index = SCALE_NAMES.index(param["Time scale"])
-        scale = SCALE_VALUES[scale_index]
-        dt = self.get_delta(ts.index, scale)
-        integral = pd.Series(np.zeros(len(ts)), name=ts.name)
-        for n in range(1, len(ts)):
-            integral[n] = integral[n - 1] + 0.5 * (ts[n] + ts[n - 1]) * dt[n]
-        return integral
+        return {"scale": SCALE_VALUES[scale_index], "index": None, "value": None, "total": 0.0}
+
+    def process_chunk(self, state, chunk):
+        values = chunk.values.astype(float)
+        index = chunk.index
+        if state["value"] is not None:
+            # The first step of the chunk starts from the last sample of the previous one
+            values = np.concatenate(([state["value"]], values))
+            index = index[:0].append(pd.Index([state["index"]])).append(index)
+
+        # the deltas of the series (see get_time_deltas), unless a sample of the previous chunk comes first (and
+        # they are not the same for all the samples)
+        deltas = get_time_deltas(chunk)
+        if state["value"] is not None and not np.isscalar(deltas):
+            deltas = get_deltas(index)
+        dt = self.get_delta(deltas, len(values), state["scale"])
+        integral = state["total"] + cumulative_trapezoid(values, dt)
+        if state["value"] is not None:
+            integral = integral[1:]
+
+        if len(integral):
+            state["index"], state["value"], state["total"] = index[-1], values[-1], integral[-1]
+        return pd.Series(integral, name=chunk.name)
 
     @staticmethod
-    def get_delta(timestamp, scale):
-        try:
-            t = timestamp.to_series()
-            return t.diff().dt.total_seconds() / scale
-        except (TypeError, AttributeError):
-            return pd.Series(np.ones(len(timestamp)))
\ No newline at end of file
+    def get_delta(deltas, length, scale):
+        # Step before each sample in units of the scale, one per sample without timestamps
+        if deltas is None:
+            return np.ones(length)
+        if np.isscalar(deltas):
+            return np.full(length, deltas / scale)
+        return deltas / scale
+
+
+def cumulative_trapezoid(values, dt):
+    # Running integral from the first sample (0), dt[n] being the step between samples n - 1 and n
+    integral = np.zeros(len(values))
+    if len(values) > 1:
+        np.cumsum(0.5 * (values[1:] + values[:-1]) * dt[1:], out=integral[1:])
+    return integral
@@ -1,6 +1,10 @@
 from functions.time_function import TimeFunction
+from scipy import signal
 import pandas as pd
-import sys
+import numpy as np
+
+TYPE_NAMES = ['Simple', 'Centered', 'Exponential', 'Median']
+MAX_WINDOW = 10**7  # samples
 
 
 class MovingAverage(TimeFunction):
@@ -9,25 +13,98 @@ class MovingAverage(TimeFunction):
 
     def get_parameters(self):
         return {
+            "Type": {
+                "type": "combo",
+                "values": TYPE_NAMES,
+                "default": 0
+            },
             "Window size": {
                 "type": "int",
                 "min": 1,
-                "max": sys.maxsize,
+                "max": MAX_WINDOW,
                 "default": 1
             }
         }
 
     def process_series(self, ts, param):
         size = int(param["Window size"])
+        kind = param.get("Type", TYPE_NAMES[0])
         length = ts.shape[0]
 
         if size < 1 or size > length:
             return None
 
-        average = pd.Series([0] * length, name=ts.name)
-        average[0] = ts[0]
-        for n in range(1, length):
-            step = max(0, n - size)
-            average[n] = average[n - 1] + (ts[n] - ts[step]) / size
+        values = ts.values.astype(float)
+        if kind == 'Centered':
+            # Window around each sample, shrinking at the edges
+            average = pd.Series(values).rolling(size, center=True, min_periods=1).mean().values
+        elif kind == 'Exponential':
+            # Same center of mass as a simple average of the window
+            average = pd.Series(values).ewm(span=size, adjust=False).mean().values
+        elif kind == 'Median':
+            average = pd.Series(values).rolling(size, center=True, min_periods=1).median().values
+        else:
+            average = self.trailing_average(values, size)
+
+        return pd.Series(average, name=ts.name)
+
+    # Chunk by chunk (see TimeFunction.init_state): the trailing and exponential averages carry the end of the
+    # previous chunk, the centred ones hold back the samples whose window is not complete yet
+    def init_state(self, param, length=None):
+        # Not for a window longer than the series (see process_series)
+        size = int(param["Window size"])
+        if size < 1 or (length is not None and size > length):
+            return None
+        return {"size": size, "kind": param.get("Type", TYPE_NAMES[0]), "last": None,
+                "buffer": np.empty(0), "start": 0, "emitted": 0, "received": 0}
+
+    def process_chunk(self, state, chunk):
+        values = chunk.values.astype(float)
+        size = state["size"]
+        if state["kind"] in ('Centered', 'Median'):
+            return pd.Series(self.centred_chunk(state, values), name=chunk.name)
+        if not len(values):
+            return pd.Series(values, name=chunk.name)
 
+        if state["kind"] == 'Exponential':
+            # y[n] = (1 - alpha) y[n - 1] + alpha x[n], from the first sample, as a first order filter
+            alpha = 2 / (size + 1)
+            last = values[0] if state["last"] is None else state["last"]
+            average, _ = signal.lfilter([alpha], [1, alpha - 1], values, zi=[(1 - alpha) * last])
+            state["last"] = average[-1]
+        else:
+            average, state["last"] = self.trailing_average(values, size, state["last"], True)
+        return pd.Series(average, name=chunk.name)
+
+    def finish(self, state):
+        if state["kind"] in ('Centered', 'Median'):
+            return self.centred_chunk(state, np.empty(0), True)
+        return None
+
+    @staticmethod
+    def centred_chunk(state, values, last=False):
+        # Values of the samples whose window is complete (all the remaining ones if last). The samples are kept
+        # from the first window still needed
+        size = state["size"]
+        back, ahead = size // 2, size - 1 - size // 2
+        state["buffer"] = np.concatenate((state["buffer"], values))
+        state["received"] += len(values)
+        stop = state["received"] if last else max(state["received"] - ahead, state["emitted"])
+
+        rolling = pd.Series(state["buffer"]).rolling(size, center=True, min_periods=1)
+        average = rolling.median() if state["kind"] == 'Median' else rolling.mean()
+        average = average.values[state["emitted"] - state["start"]:stop - state["start"]]
+
+        start = max(stop - back, 0)
+        state["buffer"] = state["buffer"][start - state["start"]:]
+        state["start"], state["emitted"] = start, stop
         return average
+
+    @staticmethod
+    def trailing_average(values, size, carry=None, keep=False):
+        # Average of the last size samples, the first sample standing for those before the start (or the last
+        # size samples of the previous chunk, carry). With keep, also those of this one
+        padded = np.concatenate((np.full(size, values[0]) if carry is None else carry, values))
+        sums = np.cumsum(padded)
+        average = (sums[size:] - sums[:-size]) / size
+        return (average, padded[-size:]) if keep else average
@@ -0,0 +1,171 @@
+import json
+import numpy as np
+import pandas as pd
+from functions.time_function import TimeFunction
+from functions.cache import ResultCache, STORE_PATH
+import config
+
+MARKERS_KEY = '.markers'
+COLUMNS_KEY = '.columns'
+CHUNK_SIZE = 2**16  # samples processed at once by the functions computed in chunks
+STREAM_LENGTH = 2**22  # samples, beyond which series are processed in chunks by the functions able to
+
+results = ResultCache()
+
+
+def get_function_classes():
+    return {function().get_name(): function for function in TimeFunction.__subclasses__()}
+
+
+def make_spec(function, name, sources, param):
+    # Entry of the configuration, to compute a function again on the other files (see config.get_function_sources)
+    spec = {"function": function, "name": name}
+    if len(sources) > 1:
+        spec["sources"] = list(sources)
+    else:
+        spec["source"] = sources[0]
+    spec["parameters"] = param
+    return spec
+
+
+def compute(function, data, param, progress=None):
+    # data is a series, or a frame for the functions of several sources (see DataFile.get_data_to_process).
+    # Results already computed on the same data are reused (see functions.cache). Functions which can process a
+    # series in chunks do so if it is long or memory-mapped, or to report progress (see compute_chunks)
+    results.set_store(STORE_PATH, config.get_function_store())
+    name = data.attrs["name"] if isinstance(data, pd.DataFrame) else data.name
+    key = results.get_key(function.get_name(), data, param)
+    values = results.get(key)
+    if values is not None:
+        if values.ndim > 1:
+            # several columns (see DataFile.add_function)
+            fs = pd.DataFrame(values, columns=results.get(key + COLUMNS_KEY))
+            fs.attrs["name"] = name
+            return fs
+        fs = pd.Series(values, name=name)
+        markers = results.get(key + MARKERS_KEY)
+        if markers is not None:
+            fs.attrs["markers"] = markers
+        return fs
+
+    if isinstance(data, pd.DataFrame):
+        fs = function.process_frame(data, param)
+    elif use_chunks(function, data, param, progress):
+        fs = compute_chunks(function, data, param, progress)
+    else:
+        fs = function.process_series(data, param)
+    if isinstance(fs, pd.DataFrame):
+        fs.attrs["name"] = name
+        results.put(key + COLUMNS_KEY, np.array(fs.columns, dtype=str))
+        results.put(key, fs.values)
+    elif fs is not None:
+        fs.name = name
+        results.put(key, fs.values)
+        # points of interest found by the function (e.g. beats), indexes of the samples
+        if fs.attrs.get("markers") is not None:
+            results.put(key + MARKERS_KEY, np.asarray(fs.attrs["markers"], dtype=np.int64))
+    return fs
+
+
+def use_chunks(function, ts, param, progress=None):
+    if isinstance(ts, pd.DataFrame) or function.init_state(param, len(ts)) is None:
+        return False
+    values = ts.values
+    mapped = isinstance(values, np.memmap) or isinstance(getattr(values, 'base', None), np.memmap)
+    return progress is not None or mapped or len(ts) > STREAM_LENGTH
+
+
+def compute_chunks(function, ts, param, progress=None, size=CHUNK_SIZE):
+    # Series processed chunk after chunk (see TimeFunction.init_state), so that only a chunk is read (and copied)
+    # at a time. progress(done, total) is called after each one: it may return False to stop. None if stopped or
+    # failed
+    state = function.init_state(param, len(ts))
+    computed = []
+    for start in range(0, len(ts), size):
+        chunk = function.process_chunk(state, get_chunk(ts, start, start + size))
+        if chunk is None:
+            return None
+        computed.append(np.asarray(chunk))
+        if progress is not None and progress(min(start + size, len(ts)), len(ts)) is False:
+            return None
+    rest = function.finish(state)
+    if rest is not None:
+        computed.append(np.asarray(rest))
+
+    values = np.concatenate(computed) if computed else np.empty(0)
+    if len(values) != len(ts):
+        config.logger.error("Function {} returned {} values for {} samples".format(
+            function.get_name(), len(values), len(ts)))
+        return None
+    return pd.Series(values, name=ts.name)
+
+
+def get_chunk(ts, start, stop):
+    # Samples of a series from start to stop, with their time deltas (see DataFile.get_time)
+    chunk = pd.Series(ts.values[start:stop], index=ts.index[start:stop], name=ts.name)
+    if "deltas" in ts.attrs:
+        deltas = ts.attrs["deltas"]
+        chunk.attrs["deltas"] = deltas if deltas is None or np.isscalar(deltas) else deltas[start:stop]
+    return chunk
+
+
+def compute_channels(function, series, param):
+    # Same function on several series (e.g. all the channels) at once, for those implementing process_channels:
+    # series without a result yet are computed in a single pass. None for those which failed
+    results.set_store(STORE_PATH, config.get_function_store())
+    keys = [results.get_key(function.get_name(), ts, param) for ts in series]
+    computed = [results.get(key) for key in keys]
+    missing = [i for i, values in enumerate(computed) if values is None]
+
+    if missing:
+        values = function.process_channels(np.column_stack([series[i].values for i in missing]), param)
+        for j, i in enumerate(missing):
+            if values is not None:
+                computed[i] = np.ascontiguousarray(values[:, j])
+                results.put(keys[i], computed[i])
+    return [None if values is None else pd.Series(values, name=ts.name) for ts, values in zip(series, computed)]
+
+
+def compute_groups(datafile, specs, functions):
+    # Functions computed on several columns of the file with the same parameters are computed together, then
+    # found in the results by apply_functions (which adds them in order)
+    groups = {}
+    for spec in specs:
+        if isinstance(spec, str) or spec["name"] in datafile.get_function_names() or "source" not in spec:
+            continue
+        if spec["source"] in list(datafile.df) and hasattr(functions.get(spec["function"]), 'process_channels'):
+            key = json.dumps([spec["function"], spec["parameters"]], sort_keys=True, default=str)
+            groups.setdefault(key, []).append(spec)
+
+    for group in groups.values():
+        if len(group) > 1:
+            series = [datafile.get_series_to_process(list(datafile.df).index(spec["source"]), spec["name"])
+                      for spec in group]
+            compute_channels(functions[group[0]["function"]](), series, group[0]["parameters"])
+
+
+def apply_functions(datafile, specs, sample=True):
+    # Adds to a file the functions of specs it does not have yet, in order (a function may use a previous one as
+    # source), downsampled for plotting if sample. Returns the names of those which could not be computed
+    functions = get_function_classes()
+    failed = []
+    compute_groups(datafile, specs, functions)
+
+    for spec in specs:
+        if isinstance(spec, str) or spec["name"] in datafile.get_function_names():
+            continue  # functions stored only by name cannot be computed again
+        sources = config.get_function_sources(spec)
+        if spec["function"] not in functions or any(source not in list(datafile.df) for source in sources):
+            config.logger.warning("Cannot compute function {} on {}".format(spec["name"], datafile.filename))
+            failed.append(spec["name"])
+            continue
+
+        columns = [list(datafile.df).index(source) for source in sources]
+        data = datafile.get_data_to_process(columns, spec["name"])
+        fs = compute(functions[spec["function"]](), data, spec["parameters"])
+        if fs is None:
+            config.logger.warning("Function {} failed on {}".format(spec["name"], datafile.filename))
+            failed.append(spec["name"])
+            continue
+        datafile.add_function(fs, sources[0], sample)
+    return failed
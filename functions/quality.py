@@ -0,0 +1,128 @@
+from functions.time_function import TimeFunction
+from numpy.lib.stride_tricks import sliding_window_view
+import pandas as pd
+import numpy as np
+
+MAX_WINDOW = 10**6  # samples
+
+
+# Signal quality indexes, computed on windows (half overlapping) of one or more channels at once: the windows are
+# strided views of the samples, all the channels are reduced together
+class ChannelQuality:
+    def get_parameters(self):
+        return {
+            "Window size": {
+                "type": "int",
+                "min": 2,
+                "max": MAX_WINDOW,
+                "default": 400
+            }
+        }
+
+    def get_quality(self, windows, values, param):
+        # windows x channels, from windows x channels x samples
+        pass
+
+    def process_series(self, ts, param):
+        quality = self.process_channels(ts.values[:, np.newaxis], param)
+        return None if quality is None else pd.Series(quality[:, 0], name=ts.name)
+
+    def process_channels(self, values, param):
+        # samples x channels
+        values = np.asarray(values, dtype=float)
+
+        def reduce(windows):
+            return self.get_quality(windows, values, param)
+        return reduce_windows(values, int(param["Window size"]), reduce)
+
+
+class ClippingRatio(ChannelQuality, TimeFunction):
+    def get_name(self):
+        return 'Clipping ratio'
+
+    def get_parameters(self):
+        parameters = super().get_parameters()
+        parameters["Margin (%)"] = {
+            "type": "double",
+            "default": 1.0
+        }
+        return parameters
+
+    def get_quality(self, windows, values, param):
+        # Samples at the extremes of the channel (within a margin of its range), where the sensor saturates
+        low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        margin = (high - low) * float(param["Margin (%)"]) / 100
+        low, high = (low + margin)[:, np.newaxis], (high - margin)[:, np.newaxis]
+        return ((windows <= low) | (windows >= high)).mean(axis=-1)
+
+
+class FlatLine(ChannelQuality, TimeFunction):
+    def get_name(self):
+        return 'Flat line'
+
+    def get_parameters(self):
+        parameters = super().get_parameters()
+        parameters["Tolerance"] = {
+            "type": "double",
+            "default": 0.0
+        }
+        return parameters
+
+    def get_quality(self, windows, values, param):
+        # Steps between samples not larger than the tolerance: 1 for a dropout
+        return (np.abs(np.diff(windows, axis=-1)) <= float(param["Tolerance"])).mean(axis=-1)
+
+
+class PerfusionIndex(ChannelQuality, TimeFunction):
+    def get_name(self):
+        return 'Perfusion index'
+
+    def get_quality(self, windows, values, param):
+        # Pulsatile (AC) over static (DC) component, in percent
+        dc = np.abs(windows.mean(axis=-1))
+        return np.where(dc > 0, (windows.max(axis=-1) - windows.min(axis=-1)) / dc * 100, np.nan)
+
+
+class SkewnessQuality(ChannelQuality, TimeFunction):
+    def get_name(self):
+        return 'Skewness SQI'
+
+    def get_quality(self, windows, values, param):
+        centred = windows - windows.mean(axis=-1, keepdims=True)
+        squared = centred * centred
+        m2 = np.mean(squared, axis=-1)
+        m3 = np.mean(squared * centred, axis=-1)
+        return np.where(m2 > 0, m3 / m2 ** 1.5, np.nan)
+
+
+class NoiseRatio(ChannelQuality, TimeFunction):
+    def get_name(self):
+        return 'SNR'
+
+    def get_quality(self, windows, values, param):
+        # Signal to noise ratio (dB), the noise being estimated from the steps between samples: white noise
+        # doubles their variance, the slower pulse wave hardly changes it
+        noise = np.var(np.diff(windows, axis=-1), axis=-1) / 2
+        power = np.var(windows, axis=-1) - noise
+        return np.where((noise > 0) & (power > 0), 10 * np.log10(power / noise), np.nan)
+
+
+def reduce_windows(values, size, reduce):
+    # reduce(windows x channels x samples) for half overlapping windows of values (samples x channels), then
+    # brought back to the samples. None if there are not enough samples
+    size = min(size, len(values))
+    if size < 2:
+        return None
+    hop = max(size // 2, 1)
+
+    windows = sliding_window_view(values, size, axis=0)[::hop]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduced = reduce(windows)
+    return align_windows(reduced, len(values), size, hop)
+
+
+def align_windows(reduced, length, size, hop):
+    # Values of windows (size samples, every hop) brought back to the samples: each sample takes the value of the
+    # window centred closest to it
+    nearest = np.rint((np.arange(length) - size / 2) / hop)
+    return reduced[np.clip(nearest, 0, len(reduced) - 1).astype(np.int64)]
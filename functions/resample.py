@@ -0,0 +1,39 @@
+from functions.time_function import TimeFunction
+from functions.filters import get_sample_rate, RATE_PARAMETER
+from resampling import get_factors, resample_values
+import pandas as pd
+import numpy as np
+
+
+class Resample(TimeFunction):
+    def get_name(self):
+        return 'Resample'
+
+    def get_parameters(self):
+        return {
+            "Target rate (Hz)": {
+                "type": "double",
+                "default": 125.0
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def process_series(self, ts, param):
+        # The series as it would be at the target rate (polyphase, anti-aliased), shown on the samples of the file:
+        # each sample takes the value of the resampled one at its time. To resample the files themselves, see the
+        # project option (DataFile.resample)
+        try:
+            rate = get_sample_rate(ts, param.get(RATE_PARAMETER))
+            target = float(param["Target rate (Hz)"])
+        except ValueError:
+            return None
+        if not rate or target <= 0 or len(ts) < 2:
+            return None
+
+        up, down = get_factors(rate, target)
+        resampled = resample_values(ts.values, up, down)
+        held = np.minimum(np.arange(len(ts)) * up // down, len(resampled) - 1)
+        return pd.Series(resampled[held], name=ts.name)
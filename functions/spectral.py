@@ -0,0 +1,157 @@
+from functions.time_function import TimeFunction
+from functions.filters import get_sample_rate, RATE_PARAMETER
+from functions.quality import align_windows, MAX_WINDOW
+from functions.cache import ResultCache
+from numpy.lib.stride_tricks import sliding_window_view
+import pandas as pd
+import numpy as np
+
+FRAMES_BUDGET = 128 * 2**20  # bytes of power spectra kept in memory
+MAX_BANDS = 256
+
+# Power spectra of the windows of a series, shared by the spectral functions: asking for another function (or
+# other frequencies) on the same source, window and hop does not transform it again
+frames = ResultCache(FRAMES_BUDGET)
+
+
+# Functions of the short-time spectrum: windows (Hann) every hop samples, transformed all together by a real FFT
+# along the last axis of their strided view. Each sample takes the value of the window centred closest to it
+class SpectralFunction:
+    def get_parameters(self):
+        return {
+            "Window size": {
+                "type": "int",
+                "min": 4,
+                "max": MAX_WINDOW,
+                "default": 512
+            },
+            "Hop": {
+                "type": "int",
+                "min": 1,
+                "max": MAX_WINDOW,
+                "default": 128
+            },
+            RATE_PARAMETER: {
+                "type": "double",
+                "default": ""
+            }
+        }
+
+    def reduce_spectrum(self, power, freqs, param):
+        # windows (x columns), from the power of windows x frequencies
+        pass
+
+    def get_columns(self, name, freqs, param):
+        # names of the columns, for functions computing several ones
+        return None
+
+    def process_series(self, ts, param):
+        size = int(param["Window size"])
+        hop = int(param["Hop"])
+        try:
+            rate = get_sample_rate(ts, param.get(RATE_PARAMETER))
+        except ValueError:
+            return None
+        if not rate or size > len(ts) or hop < 1:
+            return None
+
+        freqs = np.fft.rfftfreq(size, 1 / rate)
+        try:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                reduced = self.reduce_spectrum(get_power(ts, size, hop), freqs, param)
+        except ValueError:
+            return None
+        if reduced is None:
+            return None
+
+        values = align_windows(reduced, len(ts), size, hop)
+        columns = self.get_columns(ts.name, freqs, param)
+        if columns is not None:
+            return pd.DataFrame(values, columns=columns)
+        return pd.Series(values, name=ts.name)
+
+
+class DominantFrequency(SpectralFunction, TimeFunction):
+    def get_name(self):
+        return 'Dominant frequency'
+
+    def get_parameters(self):
+        parameters = super().get_parameters()
+        parameters["Min frequency (Hz)"] = {"type": "double", "default": 0.5}
+        parameters["Max frequency (Hz)"] = {"type": "double", "default": 5.0}
+        return parameters
+
+    def reduce_spectrum(self, power, freqs, param):
+        # Frequency of the highest peak within the range (Hz)
+        band = get_band(freqs, param["Min frequency (Hz)"], param["Max frequency (Hz)"])
+        if not band.any():
+            return None
+        power = power[:, band]
+        dominant = freqs[band][np.argmax(power, axis=1)]
+        return np.where(power.max(axis=1) > 0, dominant, np.nan)
+
+
+class BandPowerRatio(SpectralFunction, TimeFunction):
+    def get_name(self):
+        return 'Band power ratio'
+
+    def get_parameters(self):
+        parameters = super().get_parameters()
+        parameters["Min frequency (Hz)"] = {"type": "double", "default": 0.5}
+        parameters["Max frequency (Hz)"] = {"type": "double", "default": 5.0}
+        return parameters
+
+    def reduce_spectrum(self, power, freqs, param):
+        # Share of the power (the constant component excluded) within the range
+        band = get_band(freqs, param["Min frequency (Hz)"], param["Max frequency (Hz)"])
+        total = power[:, 1:].sum(axis=1)
+        return np.where(total > 0, power[:, band].sum(axis=1) / total, np.nan)
+
+
+class Spectrum(SpectralFunction, TimeFunction):
+    def get_name(self):
+        return 'Spectrum'
+
+    def get_parameters(self):
+        parameters = super().get_parameters()
+        parameters["Bands"] = {"type": "int", "min": 1, "max": MAX_BANDS, "default": 16}
+        parameters["Max frequency (Hz)"] = {"type": "double", "default": 10.0}
+        return parameters
+
+    def get_edges(self, freqs, param):
+        high = min(float(param["Max frequency (Hz)"]), freqs[-1])
+        return np.linspace(0, high, int(param["Bands"]) + 1)
+
+    def get_columns(self, name, freqs, param):
+        edges = self.get_edges(freqs, param)
+        return ["{} {:g}-{:g} Hz".format(name, a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+    def reduce_spectrum(self, power, freqs, param):
+        # Power of each band (dB), a column for each: the short-time spectrum over the samples
+        edges = self.get_edges(freqs, param)
+        if edges[-1] <= 0:
+            return None
+        bands = np.searchsorted(edges, freqs, side='right') - 1
+        bands[freqs == edges[-1]] = len(edges) - 2  # the last edge is within the last band
+        inside = (bands >= 0) & (bands < len(edges) - 1)
+        # frequencies x bands, summing the bins of each band in one product
+        assignment = np.zeros((len(freqs), len(edges) - 1))
+        assignment[np.flatnonzero(inside), bands[inside]] = 1
+        band_power = power @ assignment
+        return np.where(band_power > 0, 10 * np.log10(band_power), np.nan)
+
+
+def get_band(freqs, low, high):
+    return (freqs >= float(low)) & (freqs <= float(high))
+
+
+def get_power(ts, size, hop):
+    # Power spectrum of each window (windows x frequencies)
+    key = frames.get_key('Power spectrum', ts, [size, hop])
+    power = frames.get(key)
+    if power is None:
+        windows = sliding_window_view(ts.values.astype(float), size)[::hop]
+        windows = (windows - windows.mean(axis=-1, keepdims=True)) * np.hanning(size)
+        power = np.abs(np.fft.rfft(windows, axis=-1)) ** 2
+        frames.put(key, power)
+    return power
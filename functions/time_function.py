@@ -1,5 +1,6 @@
 import sys
 from abc import ABC, abstractmethod
+from resampling import get_deltas
 
 
 class TimeFunction(ABC):
@@ -14,3 +15,34 @@ class TimeFunction(ABC):
     @abstractmethod
     def process_series(self, ts, param):
         pass
+
+    def get_sources(self):
+        # Names of the source columns, for functions of several ones (see process_frame)
+        return ["Source"]
+
+    def process_frame(self, frame, param):
+        # Functions of several sources get them as the columns of frame, in the order of get_sources
+        return self.process_series(frame.iloc[:, 0], param)
+
+    # Optional chunked protocol, for series which should not be processed at once (long or memory-mapped files,
+    # live data): the state returned by init_state is carried from a chunk to the next one. process_chunk returns
+    # the values of the samples it could complete (None if it failed), finish those held back until the end (e.g.
+    # by a centred window): all together, as many values as samples, the same as process_series. length is that
+    # of the whole series when known (None for live data). Functions (or parameters) without a state are only
+    # computed on whole series
+    def init_state(self, param, length=None):
+        return None
+
+    def process_chunk(self, state, chunk):
+        return None
+
+    def finish(self, state):
+        return None
+
+
+def get_time_deltas(ts):
+    # Seconds between each sample and the previous one, shared by the series of a file (see DataFile.get_time) or
+    # from the index: a single value if the sampling is uniform, None without timestamps
+    if "deltas" in ts.attrs:
+        return ts.attrs["deltas"]
+    return get_deltas(ts.index)
@@ -160,6 +160,7 @@ class LabelerWindow(QMainWindow):
 
         reset = file.addAction('Reset')
         save = file.addAction('Save')
+        export = file.addAction('Export labeled file')
         file.addSeparator()
         next_file = file.addAction('Next file')
         prev_file = file.addAction('Previous file')
@@ -170,6 +171,7 @@ class LabelerWindow(QMainWindow):
 
         reset.setShortcut('R')
         save.setShortcut('S')
+        export.setShortcut('Ctrl+E')
         next_file.setShortcut('N')
         prev_file.setShortcut('P')
         settings.setShortcut('Ctrl+O')
@@ -178,6 +180,7 @@ class LabelerWindow(QMainWindow):
 
         reset.setIcon(QIcon('./assets/reset.png'))
         save.setIcon(QIcon('./assets/save.png'))
+        export.setIcon(QIcon('./assets/save.png'))
         next_file.setIcon(QIcon('./assets/next_file.png'))
         prev_file.setIcon(QIcon('./assets/prev_file.png'))
         settings.setIcon(QIcon('./assets/setting.png'))
@@ -186,6 +189,7 @@ class LabelerWindow(QMainWindow):
 
         reset.triggered.connect(self.plot_canvas.reset)
         save.triggered.connect(self.plot_canvas.save)
+        export.triggered.connect(self.plot_canvas.export)
         next_file.triggered.connect(self.plot_canvas.next_file)
         prev_file.triggered.connect(self.plot_canvas.prev_file)
         settings.triggered.connect(self.open_settings)
@@ -217,6 +221,11 @@ class LabelerWindow(QMainWindow):
             func_entry = functions.addAction(function)
             func_entry.triggered.connect(make_caller(self.open_function_setup, i))
         functions.addSeparator()
+        if config.is_project():
+            apply_all = functions.addMenu("Apply to all files")
+            for i, function in enumerate(FunctionController.get_functions()):
+                func_entry = apply_all.addAction(function)
+                func_entry.triggered.connect(make_caller(self.open_function_batch, i))
         self.remove_function = functions.addMenu("Remove function")
         self.update_functions()
 
@@ -239,8 +248,15 @@ class LabelerWindow(QMainWindow):
         self.update_dimensions()
 
     def open_function_setup(self, func_index):
-        if FunctionController.add(func_index):
+        names = FunctionController.add(func_index)
+        if names:
             self.plot_canvas.modified = True
+            self.plot_canvas.core.redraw_columns(names)
+            self.update_functions()
+
+    def open_function_batch(self, func_index):
+        if FunctionController.apply_to_project(func_index):
+            self.plot_canvas.core.redraw()
             self.update_functions()
 
     def open_function_removal(self, rem_index):
@@ -9,22 +9,82 @@ N_MAX = 4000
 
 
 def get_nearest_index(x, values):
-    prev = np.inf
-    for i, v in enumerate(values):
-        delta = abs(v - x)
-        if delta < prev:
-            prev = delta
-        else:
-            return i-1
-    return len(values)-1
+    # values are sorted (timestamps): binary search, ties resolved towards the first
+    i = int(np.searchsorted(values, x))
+    if i == 0:
+        return 0
+    if i == len(values):
+        return len(values)-1
+    return i-1 if x - values[i-1] <= values[i] - x else i
+
+
+def minmax_downsample(ts, n_out):
+    # Minimum and maximum of each bucket, in their original order. Buckets are read one at a time, so no
+    # full-size temporary is created (lttb needs a copy of the whole series): suits memory-mapped data
+    values = ts.values
+    n_buckets = max(n_out // 2, 1)
+    edges = np.linspace(0, len(values), n_buckets + 1).astype(np.int64)
+
+    index = np.empty(2 * n_buckets, dtype=np.int64)
+    for k in range(n_buckets):
+        bucket = values[edges[k]:edges[k+1]]
+        i = edges[k] + np.argmin(bucket)
+        j = edges[k] + np.argmax(bucket)
+        index[2*k], index[2*k+1] = min(i, j), max(i, j)
+
+    return pd.Series(values[index], index=index, name=ts.name)
+
+
+def downsample(ts, low_memory=False):
+    # Series reduced to N_MAX points for plotting, None if already small enough
+    if ts.shape[0] <= N_MAX:
+        return None
+    if low_memory:
+        return minmax_downsample(ts, N_MAX)
+
+    # lttb does not accept missing values (e.g. at the start of a function column): they are not drawn
+    finite = np.isfinite(ts.values) if ts.dtype.kind == 'f' else None
+    if finite is not None and not finite.all():
+        ts = pd.Series(ts.values[finite], index=ts.index[finite], name=ts.name)
+        if ts.shape[0] <= N_MAX:
+            return ts
+
+    out = lttb.downsample(np.array([ts.index, ts]).T, N_MAX)
+    return pd.Series(out[:, 1], index=out[:, 0], name=ts.name)
+
+
+def minmax_range(values, a, b, n_out):
+    # Positions and values of the minimum and maximum of each of n_out / 2 buckets of the samples [a, b), in their
+    # order, all the buckets at once. Only those samples are read; missing values are not drawn
+    n_buckets = max(n_out // 2, 1)
+    size = -(-(b - a) // n_buckets)
+    samples = np.asarray(values[a:b], dtype=float)
+    buckets = np.full(n_buckets * size, np.nan)
+    buckets[:len(samples)] = samples
+    buckets = buckets.reshape(n_buckets, size)
+    missing = np.isnan(buckets)
+    low = np.where(missing, np.inf, buckets).argmin(axis=1)
+    high = np.where(missing, -np.inf, buckets).argmax(axis=1)
+
+    offsets = np.arange(n_buckets)[:, np.newaxis] * size
+    positions = (offsets + np.sort(np.stack([low, high], axis=1), axis=1)).ravel()
+    positions = positions[positions < len(samples)]
+    positions = positions[np.isfinite(samples[positions])]
+    return a + positions, samples[positions]
 
 
 class Plotter:
-    def __init__(self, plot, draw_set, timestamp, norm):
+    def __init__(self, plot, draw_set, timestamp, norm, low_memory=False, sampled_set=None, markers=None,
+                 pyramids=None, ranges=None):
         self.plot = plot
         self.draw_set = draw_set
+        self.sampled_set = sampled_set  # draw_set already downsampled (e.g. prefetched), if available
+        self.markers = markers  # for each series of draw_set, indexes of the samples to mark (or None)
+        self.pyramids = pyramids  # for each series of draw_set, its downsampling pyramid (see summary), or None
+        self.ranges = ranges  # for each series of draw_set, its (min, max) if already known (see summary), or None
         self.timestamp = timestamp
         self.normalize = norm
+        self.low_memory = low_memory  # draw_set is memory-mapped: never copy it whole
 
         self.rects = []  # one for each label
         self.line = self.plot.axvline(x=0, linestyle='dashed', color='black', linewidth=1)
@@ -32,11 +92,18 @@ class Plotter:
         self.y = 0
         self.h = 1
 
+        self.lines = []  # one for each series of draw_set
+        self.bounds = None  # normalisation of each series, if normalized
+        self.overview = []  # data of the lines showing the whole series
+        self.visible = None  # range of samples drawn, [a, b)
+
         if self.is_empty():
             plot.get_yaxis().set_visible(False)
-            self.manage_timestamp() if self.timestamp else None
+            self.manage_timestamp() if len(self.timestamp) else None
         else:
             self.draw()
+            # zoom, pan or any other change of range
+            self.plot.callbacks.connect('xlim_changed', self.redraw_visible)
 
     def is_empty(self):
         return not self.draw_set
@@ -64,12 +131,17 @@ class Plotter:
         return rect_list
 
     def draw(self):
-        point_set = self.process_series()
-        point_set = [(ts-ts.min())/(ts.max()-ts.min()) for ts in point_set] if self.normalize else point_set
-        point_set = self.insert_timestamp(point_set) if self.timestamp else point_set
-
-        [self.plot.plot(df, label=df.name) for df in point_set]
-        self.manage_timestamp() if self.timestamp else None
+        point_set = self.sampled_set if self.sampled_set is not None else self.process_series()
+        bounds = [self.get_range(i, ts) for i, ts in enumerate(point_set)] if self.normalize else None
+        point_set = [(ts-a)/(b-a) for ts, (a, b) in zip(point_set, bounds)] if self.normalize else point_set
+        point_set = self.insert_timestamp(point_set) if len(self.timestamp) else point_set
+
+        lines = [self.plot.plot(df, label=df.name)[0] for df in point_set]
+        self.draw_markers(lines, bounds)
+        self.lines, self.bounds = lines, bounds
+        self.overview = [line.get_data() for line in lines]
+        self.visible = (0, self.draw_set[0].shape[0])
+        self.manage_timestamp() if len(self.timestamp) else None
 
         # Moves cursor above the time series
         self.plot.add_line(self.plot.get_lines()[0])
@@ -78,6 +150,24 @@ class Plotter:
         self.h = abs(ylim[1] - ylim[0])
         self.y = min(ylim)
 
+    def get_range(self, i, points):
+        # Normalisation bounds of a series: from the statistics of the whole series if known, else from its points
+        if self.ranges is not None and self.ranges[i] is not None:
+            return self.ranges[i]
+        return points.min(), points.max()
+
+    def draw_markers(self, lines, bounds):
+        # Marked samples are read from the full series, only where they are
+        for i, indexes in enumerate(self.markers or []):
+            if indexes is None or not len(indexes):
+                continue
+            y = self.draw_set[i].values[indexes].astype(float)
+            if bounds is not None:
+                y = (y - bounds[i][0]) / (bounds[i][1] - bounds[i][0])
+            x = self.timestamp[indexes] if len(self.timestamp) else indexes
+            self.plot.plot(x, y, linestyle='', marker='v', markersize=4, color=lines[i].get_color(),
+                           label='_nolegend_')
+
     def zoom(self, factor):
         center_on = self.line.get_xdata()[0]
         xlim = self.plot.axes.get_xlim()
@@ -86,18 +176,52 @@ class Plotter:
         new_xlim_min = center_on + (xlim[0] - center_on) / factor
         new_xlim_max = new_xlim_min + dim / factor
 
-        # Requires special handling if downsampled: not all points can be shown at once
-        #if self.is_sampled():
-        #    self.plot.clear()
-        #    self.line = self.plot.axvline(x=center_on, linestyle='dashed', color='black', linewidth=1)
-        #    zoomed_set = self.process_zoom([new_xlim_min, new_xlim_max])
-        #    zoomed_set = self.insert_timestamp(zoomed_set) if self.timestamp else zoomed_set
-        #    [self.plot.plot(df) for df in zoomed_set]
-        #    self.manage_timestamp() if self.timestamp else None
-        #    self.plot.add_line(self.plot.get_lines()[0])
-
+        # the visible samples are drawn again (see redraw_visible)
         self.plot.set_xlim([new_xlim_min, new_xlim_max])
 
+    def redraw_visible(self, axes=None):
+        # Only the visible range is drawn, at screen resolution, or sample by sample when there are few enough.
+        # The whole series keeps its first downsampling
+        a, b = self.get_visible_range(self.plot.get_xlim())
+        if (a, b) == self.visible or not self.lines:
+            return
+        self.visible = (a, b)
+
+        whole = a == 0 and b == self.draw_set[0].shape[0]
+        n_out = min(N_MAX, max(2 * int(self.plot.bbox.width), 2))
+        for i, line in enumerate(self.lines):
+            if whole:
+                line.set_data(*self.overview[i])
+                continue
+            positions, values = self.downsample_range(i, a, b, n_out)
+            if self.bounds is not None:
+                values = (values - self.bounds[i][0]) / (self.bounds[i][1] - self.bounds[i][0])
+            line.set_data(self.timestamp[positions] if len(self.timestamp) else positions, values)
+
+    def get_visible_range(self, xlim):
+        # Samples [a, b) within xlim, plus one on each side so that the lines reach the edges
+        n_rows = self.draw_set[0].shape[0]
+        if len(self.timestamp):
+            a = int(np.searchsorted(self.timestamp, xlim[0])) - 1
+            b = int(np.searchsorted(self.timestamp, xlim[1], side='right')) + 1
+        else:
+            a = int(np.floor(xlim[0]))
+            b = int(np.ceil(xlim[1])) + 1
+        a, b = min(max(a, 0), n_rows), min(max(b, 0), n_rows)
+        return a, max(a, b)
+
+    def downsample_range(self, i, a, b, n_out):
+        # Positions and values of the points drawn for samples [a, b) of a series: the samples themselves, or
+        # from its pyramid if it has one (reading nothing from a memory-mapped file), or their minima and maxima
+        ts = self.draw_set[i]
+        if b - a <= n_out:
+            return np.arange(a, b), ts.values[a:b]
+        pyramid = self.pyramids[i] if self.pyramids else None
+        sampled = pyramid.downsample(a, b, n_out) if pyramid is not None else None
+        if sampled is not None:
+            return sampled.index.values, sampled.values
+        return minmax_range(ts.values, a, b, n_out)
+
     def zoom_out(self):
         self.zoom(0.5)
 
@@ -125,30 +249,15 @@ class Plotter:
         if n_rows <= N_MAX:
             return self.draw_set
 
-        sampled_set = []
-        for ts in self.draw_set:
-            out = lttb.downsample(np.array([ts.index, ts]).T, N_MAX)
-            sampled_set.append(pd.Series(out[:, 1], index=out[:, 0], name=ts.name))
-        return sampled_set
-
-    def process_zoom(self, xlim):
-        a = get_nearest_index(xlim[0], self.timestamp) if self.timestamp else max(int(xlim[0]), 0)
-        b = get_nearest_index(xlim[1], self.timestamp) if self.timestamp else min(int(xlim[1])+1, len(self.draw_set[0]))
-        zoomed_set = [df.iloc[a:b] for df in self.draw_set]
-
-        if b - a <= N_MAX:
-            return zoomed_set
-
-        sampled_set = []
-        for ts in zoomed_set:
-            out = lttb.downsample(np.array([ts.index, ts]).T, N_MAX)
-            sampled_set.append(pd.Series(out[:, 1], index=out[:, 0], name=ts.name))
-        return sampled_set
+        return [downsample(ts, self.low_memory) for ts in self.draw_set]
 
     def insert_timestamp(self, point_set):
+        # New series: the given ones may be shared (data columns, prefetched samples)
+        timed_set = []
         for ts in point_set:
-            ts.index = [self.timestamp[int(i)] for i in ts.index] if self.is_sampled() else self.timestamp
-        return point_set
+            index = self.timestamp[ts.index.astype(int)] if self.is_sampled() else self.timestamp
+            timed_set.append(pd.Series(ts.values, index=index, name=ts.name))
+        return timed_set
 
     def manage_timestamp(self):
         span = self.timestamp[-1] - self.timestamp[0]
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Loads files in a background thread before they are requested (e.g. the neighbours of the current one).
+# Each job is tagged with a stamp describing the file on disk when it was scheduled: a prefetched file
+# is only handed out if the stamp still matches, so files changed in the meantime are loaded again.
+class Prefetcher:
+    def __init__(self, load):
+        self.load = load  # index -> loaded object, called on the worker thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.jobs = {}  # index -> (stamp, future)
+
+    def schedule(self, stamps):
+        # stamps: {index: stamp} of the files to keep ready, any other job is dropped
+        for index in list(self.jobs):
+            if index not in stamps:
+                self.jobs.pop(index)[1].cancel()
+
+        for index, stamp in stamps.items():
+            if index in self.jobs and self.jobs[index][0] == stamp:
+                continue
+            if index in self.jobs:
+                self.jobs[index][1].cancel()
+            self.jobs[index] = (stamp, self.executor.submit(self.load, index))
+
+    def take(self, index, stamp):
+        # Prefetched object if up to date (waits if it is still loading), None otherwise
+        job = self.jobs.pop(index, None)
+        if job is None:
+            return None
+        if job[0] != stamp:
+            job[1].cancel()
+            return None
+
+        try:
+            return job[1].result()
+        except Exception:
+            # Errors are reported when the file is loaded again in the foreground
+            return None
+
+    def clear(self):
+        for stamp, future in self.jobs.values():
+            future.cancel()
+        self.jobs.clear()
+
+    def shutdown(self):
+        # No more jobs: those not started are dropped, the one running is not waited for
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
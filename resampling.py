@@ -0,0 +1,50 @@
+from fractions import Fraction
+from scipy import signal
+import numpy as np
+import pandas as pd
+
+MAX_FACTOR = 1000  # largest up or down factor of the polyphase filter
+UNIFORM_TOLERANCE = 1e-6  # relative difference between steps still taken as uniform sampling
+
+
+def get_factors(rate, target):
+    # (up, down) such that rate * up / down is the target rate, or its closest approximation
+    ratio = Fraction(float(target) / float(rate)).limit_denominator(MAX_FACTOR)
+    return ratio.numerator, ratio.denominator
+
+
+def resample_values(values, up, down):
+    # Polyphase resampling of all the columns of values (samples x columns) at once, with its anti-aliasing
+    # filter (Kaiser window). The edges are padded with their last values rather than zeros
+    return signal.resample_poly(np.asarray(values, dtype=float), up, down, axis=0, padtype='line')
+
+
+def remap_range(a, b, up, down, length):
+    # Range of samples (first, last) once resampled by up / down, covering the same span of time
+    first = min(a * up // down, length - 1)
+    last = min(-(-(b + 1) * up // down) - 1, length - 1)
+    return int(first), int(max(first, last))
+
+
+def get_timestamps(start, rate, length):
+    # Regular timestamps from start, at rate (Hz)
+    return pd.Timestamp(start) + pd.to_timedelta(np.arange(length) / float(rate), unit='s')
+
+
+def get_rate(timestamps):
+    # From the median step between timestamps (None without them)
+    if len(timestamps) < 2:
+        return None
+    step = np.median(np.diff(np.asarray(timestamps, dtype='datetime64[ns]')).astype(np.int64)) / 1e9
+    return 1 / step if step > 0 else None
+
+
+def get_deltas(index):
+    # Seconds from each timestamp to the previous one (NaN for the first): a single value if the sampling is
+    # uniform, None without timestamps
+    if not isinstance(index, pd.DatetimeIndex):
+        return None
+    steps = np.diff(index.values.astype('datetime64[ns]').astype(np.int64)) / 1e9
+    if len(steps) and steps[0] > 0 and np.all(np.abs(steps - steps[0]) <= UNIFORM_TOLERANCE * steps[0]):
+        return float(steps[0])
+    return np.concatenate(([np.nan], steps))[:len(index)]
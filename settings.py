@@ -91,8 +91,45 @@ class GeneralTab(QWidget):
         self.autosave = QCheckBox("Autosave")
         self.autosave.setChecked(config.get_autosave())
 
+        # Binary copy of the labeled files (faster reopening)
+        self.binary_copy = QCheckBox("Binary copy")
+        self.binary_copy.setToolTip("Also save labeled files in a binary format, which is much faster to reopen")
+        self.binary_copy.setChecked(config.get_binary_copy())
+
+        # Memory-mapped files (for recordings that do not fit in memory)
+        self.memory_map = QCheckBox("Memory-mapped files")
+        self.memory_map.setToolTip("Convert files once to a binary copy and map it instead of loading it in memory")
+        self.memory_map.setChecked(config.get_memory_map())
+
+        # Labels saved on their own, the labeled files are only written on export
+        self.labels_only = QCheckBox("Save labels only")
+        self.labels_only.setToolTip("Save only the label intervals; write the labeled files with File > Export")
+        self.labels_only.setChecked(config.get_labels_only())
+
+        # Function results kept on disk, reused in later sessions
+        self.function_store = QCheckBox("Store function results")
+        self.function_store.setToolTip("Keep the results of the functions on disk, to reuse them in later sessions")
+        self.function_store.setChecked(config.get_function_store())
+
+        # Number of files loaded in advance on each side of the current one
+        self.prefetch = QSpinBox()
+        self.prefetch.setRange(0, 5)
+        self.prefetch.setValue(config.get_prefetch_depth())
+
+        # Memory for the files already visited, kept with their unsaved changes
+        self.cache_size = QSpinBox()
+        self.cache_size.setRange(0, 65536)
+        self.cache_size.setSingleStep(128)
+        self.cache_size.setValue(config.get_cache_size())
+
         gg_layout = QVBoxLayout()
         gg_layout.addWidget(self.autosave)
+        gg_layout.addWidget(self.binary_copy)
+        gg_layout.addWidget(self.memory_map)
+        gg_layout.addWidget(self.labels_only)
+        gg_layout.addWidget(self.function_store)
+        gg_layout.addWidget(stack_horizontally(QLabel("Prefetched files"), self.prefetch))
+        gg_layout.addWidget(stack_horizontally(QLabel("Cache size (MB)"), self.cache_size))
         gg_layout.addWidget(spacer_widget(QSizePolicy.Minimum, QSizePolicy.Expanding))
         global_group.setLayout(gg_layout)
 
@@ -137,8 +174,16 @@ class GeneralTab(QWidget):
 
     def apply(self):
         autosave = self.autosave.isChecked()
+        binary_copy = self.binary_copy.isChecked()
+        memory_map = self.memory_map.isChecked()
+        labels_only = self.labels_only.isChecked()
+        function_store = self.function_store.isChecked()
+        prefetch = self.prefetch.value()
+        cache_size = self.cache_size.value()
         plot_h = self.plot_height.value() / 100
-        config.set_tsl_config(autosave=autosave, plot_height=plot_h)
+        config.set_tsl_config(autosave=autosave, plot_height=plot_h, prefetch=prefetch, cache_size=cache_size,
+                              binary_copy=binary_copy, memory_map=memory_map, labels_only=labels_only,
+                              function_store=function_store)
 
     def height_change(self):
         height = self.plot_height.value()
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+PYRAMID_BASE = 64  # samples per bucket at the finest level of the pyramid
+PYRAMID_FACTOR = 4  # buckets merged at each coarser level
+
+
+def get_runs(mask):
+    # Run-length encoding of a boolean array: first and last index of each run of True values
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return edges[0::2], edges[1::2] - 1
+
+
+# Min/max downsampling pyramid of a column, built chunk by chunk. Each level stores, for every bucket, the
+# position and value of its minimum and maximum: any range can then be drawn at screen resolution by
+# reading a few thousand buckets, without going through the samples again.
+class Pyramid:
+    def __init__(self):
+        self.levels = []
+        self.base = []  # finest level, as a list of per-chunk arrays until finished
+        self.carry_pos = np.empty(0, dtype=np.int64)
+        self.carry_val = np.empty(0)
+
+    def add(self, start, values):
+        positions = np.concatenate([self.carry_pos, np.arange(start, start + len(values), dtype=np.int64)])
+        values = np.concatenate([self.carry_val, values.astype(float)])
+
+        full = len(values) // PYRAMID_BASE * PYRAMID_BASE
+        if full:
+            self.base.append(self.reduce(positions[:full], values[:full], PYRAMID_BASE))
+        self.carry_pos, self.carry_val = positions[full:], values[full:]
+
+    def finish(self):
+        if len(self.carry_val):
+            self.base.append(self.reduce(self.carry_pos, self.carry_val, len(self.carry_val)))
+        if not self.base:
+            return
+        level = tuple(np.concatenate([part[i] for part in self.base]) for i in range(4))
+        self.levels = [level]
+        self.base = []
+
+        while len(level[0]) > PYRAMID_FACTOR:
+            level = self.merge(level)
+            self.levels.append(level)
+
+    @staticmethod
+    def reduce(positions, values, size):
+        # (min positions, min values, max positions, max values) of buckets of the given size
+        positions = positions.reshape(-1, size)
+        values = values.reshape(-1, size)
+        rows = np.arange(values.shape[0])
+        missing = np.isnan(values)  # gaps are skipped, a bucket of gaps only keeps one
+        i_min = np.argmin(np.where(missing, np.inf, values), axis=1)
+        i_max = np.argmax(np.where(missing, -np.inf, values), axis=1)
+        return positions[rows, i_min], values[rows, i_min], positions[rows, i_max], values[rows, i_max]
+
+    @staticmethod
+    def merge(level):
+        # Coarser level: PYRAMID_FACTOR buckets at a time, padding the last group with its last bucket
+        n = len(level[0])
+        pad = -n % PYRAMID_FACTOR
+        padded = [np.concatenate([a, a[-1:].repeat(pad)]).reshape(-1, PYRAMID_FACTOR) for a in level]
+        rows = np.arange(padded[0].shape[0])
+        i_min = np.argmin(np.where(np.isnan(padded[1]), np.inf, padded[1]), axis=1)
+        i_max = np.argmax(np.where(np.isnan(padded[3]), -np.inf, padded[3]), axis=1)
+        return padded[0][rows, i_min], padded[1][rows, i_min], padded[2][rows, i_max], padded[3][rows, i_max]
+
+    def downsample(self, a, b, n_out, name=None):
+        # Series of at most n_out points describing samples [a, b), from the finest level coarse enough;
+        # None if even single buckets are too coarse (the samples themselves should be drawn)
+        for k, level in enumerate(self.levels):
+            size = PYRAMID_BASE * PYRAMID_FACTOR**k
+            first, last = a // size, min(-(-b // size), len(level[0]))
+            if 2 * (last - first) > n_out:
+                continue
+            if k == 0 and (b - a) <= n_out:
+                return None
+
+            p_min, v_min, p_max, v_max = (x[first:last] for x in level)
+            ordered = p_min <= p_max
+            positions = np.stack([np.where(ordered, p_min, p_max), np.where(ordered, p_max, p_min)], axis=1)
+            values = np.stack([np.where(ordered, v_min, v_max), np.where(ordered, v_max, v_min)], axis=1)
+            return pd.Series(values.ravel(), index=positions.ravel(), name=name)
+        return None
+
+
+# Statistics, label ranges and downsampling pyramids of a file, accumulated over its chunks: the whole file
+# never needs to be in memory at once.
+class ChunkSummary:
+    def __init__(self, is_label):
+        self.is_label = is_label  # column name -> True if it holds labels
+        self.rows = 0
+        self.columns = None
+        self.stats = {}  # name -> count, min, max, sum, sum of squares
+        self.label_ranges = {}  # name -> [(a, b)]
+        self.open_ranges = {}  # name -> start of the range still open at the end of the last chunk
+        self.pyramids = {}  # name -> Pyramid
+
+    def add(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            for name in set(self.columns):
+                if self.columns.count(name) > 1:
+                    continue  # ambiguous, columns with the same name are not summarised
+                if self.is_label(name):
+                    self.label_ranges[name] = []
+                    self.open_ranges[name] = None
+                else:
+                    self.stats[name] = None
+                    self.pyramids[name] = Pyramid()
+
+        for i, name in enumerate(self.columns):
+            if name in self.label_ranges:
+                self.add_labels(name, chunk.iloc[:, i].values)
+            elif name in self.stats:
+                values = chunk.iloc[:, i].values
+                if not np.issubdtype(values.dtype, np.number):
+                    self.stats.pop(name)
+                    self.pyramids.pop(name)
+                    continue
+                self.add_stats(name, values)
+                self.pyramids[name].add(self.rows, values)
+
+        self.rows += chunk.shape[0]
+
+    def add_stats(self, name, values):
+        values = values[~np.isnan(values)] if np.issubdtype(values.dtype, np.floating) else values
+        if not len(values):
+            return
+        values = values.astype(float)
+        current = (len(values), values.min(), values.max(), values.sum(), np.dot(values, values))
+        previous = self.stats[name]
+        if previous is None:
+            self.stats[name] = current
+        else:
+            self.stats[name] = (previous[0] + current[0], min(previous[1], current[1]), max(previous[2], current[2]),
+                                previous[3] + current[3], previous[4] + current[4])
+
+    def add_labels(self, name, values):
+        # Ranges of consecutive 1s, a range may continue from the previous chunk
+        starts, ends = get_runs(pd.to_numeric(pd.Series(values), errors='coerce').values == 1)
+        starts, ends = starts + self.rows, ends + self.rows
+
+        ranges = self.label_ranges[name]
+        if len(starts) and self.open_ranges[name] is not None and starts[0] == self.rows:
+            starts[0] = self.open_ranges[name]
+        elif self.open_ranges[name] is not None:
+            ranges.append((self.open_ranges[name], self.rows - 1))
+        self.open_ranges[name] = None
+
+        if len(ends) and ends[-1] == self.rows + len(values) - 1:
+            self.open_ranges[name] = int(starts[-1])
+            starts, ends = starts[:-1], ends[:-1]
+        ranges.extend((int(a), int(b)) for a, b in zip(starts, ends))
+
+    def finish(self):
+        for name, start in self.open_ranges.items():
+            if start is not None:
+                self.label_ranges[name].append((start, self.rows - 1))
+        self.open_ranges = {}
+        for pyramid in self.pyramids.values():
+            pyramid.finish()
+        return self
+
+    def get_statistics(self, name):
+        # count, min, max, mean and standard deviation of a column, None if not available
+        stats = self.stats.get(name)
+        if stats is None:
+            return None
+        count, minimum, maximum, total, squares = stats
+        mean = total / count
+        return {"count": count, "min": minimum, "max": maximum, "mean": mean,
+                "std": np.sqrt(max(squares / count - mean * mean, 0.0))}
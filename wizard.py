@@ -34,6 +34,7 @@ class ProjectWizard(QWizard):
             "binary_class": class_type,
             "independent_channels": channels_type
         }
+        self.project.update(self.labels_page.generate_rate_options())
 
 
 # noinspection PyArgumentList
@@ -127,6 +128,19 @@ class Page2(QWizardPage):
         bar_layout_2.addWidget(ad_project)
         bar_layout_2.addWidget(label_method)
 
+        # files at different rates brought to a common one when opened (0: as they are). The rate of files without
+        # timestamps is also used by the functions
+        self.resample = QDoubleSpinBox()
+        self.resample.setRange(0, 100000)
+        self.resample.setSuffix(" Hz")
+        self.sample_rate = QDoubleSpinBox()
+        self.sample_rate.setRange(0, 100000)
+        self.sample_rate.setSuffix(" Hz")
+        rate_layout = QFormLayout()
+        rate_layout.addRow("Resample on load to:", self.resample)
+        rate_layout.addRow("Rate of files without timestamps:", self.sample_rate)
+        bar_layout_2.addLayout(rate_layout, 3, 0)
+
         bar_2 = QWidget()
         bar_2.setLayout(bar_layout_2)
         layout.addWidget(bar_2)
@@ -195,5 +209,13 @@ class Page2(QWizardPage):
                 additional_options.append('false')
         return additional_options
 
+    def generate_rate_options(self):
+        options = {}
+        if self.resample.value():
+            options["resample"] = self.resample.value()
+        if self.sample_rate.value():
+            options["sample_rate"] = self.sample_rate.value()
+        return options
+
     def isComplete(self):
         return self.table.rowCount() > 0
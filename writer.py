@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Writes files in a background thread, so that saving never blocks the interface. Each job is tagged with a
+# key, (path, kind of save): a job still waiting is replaced by a newer one with the same key, so saving the
+# same file repeatedly only writes its latest version.
+class Writer:
+    def __init__(self, logger):
+        self.logger = logger
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self.lock = threading.Lock()
+        self.pending = {}  # key -> job not started yet
+        self.futures = {}  # key -> future of its last job
+        self.written = set()  # paths written since last asked (see pop_written)
+        self.failed = set()  # keys whose last job failed, since last asked (see pop_failed)
+
+    def submit(self, key, job):
+        # job: function without arguments, called on the writer thread
+        key = (str(key[0]), key[1])
+        with self.lock:
+            queued = key in self.pending
+            self.pending[key] = job
+            if not queued:
+                self.futures[key] = self.executor.submit(self.run, key)
+
+    def run(self, key):
+        with self.lock:
+            job = self.pending.pop(key)
+        try:
+            job()
+        except Exception:
+            self.logger.exception("Unable to save {}".format(key[0]))
+            with self.lock:
+                self.failed.add(key)
+            return
+        with self.lock:
+            self.written.add(key[0])
+            self.failed.discard(key)
+
+    def is_busy(self):
+        return any(not future.done() for future in list(self.futures.values()))
+
+    def wait(self, path=None):
+        # Waits for the jobs writing path (all jobs if None)
+        for key, future in list(self.futures.items()):
+            if path is None or key[0] == str(path):
+                future.result()
+
+    def pop_written(self):
+        with self.lock:
+            written, self.written = self.written, set()
+        return written
+
+    def pop_failed(self):
+        with self.lock:
+            failed, self.failed = self.failed, set()
+        return failed